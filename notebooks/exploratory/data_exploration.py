@@ -10,6 +10,10 @@ import sklearn
 import datetime
 from IPython.core.interactiveshell import InteractiveShell
 
+from src.data.context import get_context
+from src.data.quality import daily_match_rate, reconcile_prices
+from src.data.transactions import read_transactions
+
 # Setting styles
 sns.set(style="whitegrid", color_codes=True)
 InteractiveShell.ast_node_interactivity = "all"
@@ -19,39 +23,25 @@ InteractiveShell.ast_node_interactivity = "all"
 # Loading the data
 raw_path = os.path.join("data", "raw")
 
-# for trans we do not want the header
-data_trans = pd.read_csv(
-    os.path.join(raw_path, "trans.csv"), skiprows=1, header=None, sep="\n"
-)
-data_trans = data_trans[0].str.split(",", expand=True)
-data_orders = pd.read_csv(
-    os.path.join(raw_path, "orders_translated.csv"), sep=";", decimal=","
-)
-data_items = pd.read_csv(os.path.join(raw_path, "lineitems.csv"), sep=";", decimal=",")
+# the baskets of trans.csv as a sparse matrix of item ids
+transactions = read_transactions(os.path.join(raw_path, "trans.csv"))
+context = get_context()
+data_orders = context.orders()
+data_items = context.lineitems()
 
-data_trans.head()
+[transactions.basket(t) for t in range(5)]
 data_orders.head()
 data_items.head()
 
-data_trans.dtypes
 data_orders.dtypes
 data_items.dtypes
 
-data_trans.shape
+transactions
 data_orders.shape
 data_items.shape
 
 #%%
 
-# Adding total price to items that takes into account the number of items
-data_items["total_price"] = data_items["unit_price"] * data_items["product_quantity"]
-
-#%%
-
-# correcting the datetime columns
-data_orders.created_date = pd.to_datetime(data_orders.created_date)
-data_items.date = pd.to_datetime(data_items.date)
-
 # adding normalized versions for easier handling
 data_orders["created_date_norm"] = data_orders["created_date"].dt.normalize()
 data_items["date_norm"] = data_items["date"].dt.normalize()
@@ -78,8 +68,9 @@ data_items[
 
 #%%
 
-# Checking missing values
-data_trans.isnull().sum()
+# Checking missing values, the baskets with fewer items than the column
+# number + 1 of trans.csv read as a table
+pd.Series(np.bincount(transactions.basket_sizes()).cumsum()[:-1])
 data_orders.isnull().sum()
 data_items.isnull().sum()
 
@@ -177,9 +168,9 @@ data_items[data_items.unit_price < 0]
 #%%
 
 # Lets combine the orders and items with an inner join
-data_orders_items = data_orders.join(
-    data_items.set_index("id_order"), how="outer", on="id_order", lsuffix="_item"
-)
+data_orders_items = context.orders_items()
+data_orders_items["created_date_norm"] = data_orders_items.created_date.dt.normalize()
+data_orders_items["date_norm"] = data_orders_items.date.dt.normalize()
 data_orders_items.head()
 data_orders_items.isnull().sum()
 data_orders_items.isnull().mean().multiply(100).round(1)
@@ -313,63 +304,17 @@ data_orders_items_only_two_ts.count()
 #%% Lets check lastly how many percent of the orders total_paid match the
 # price from their individual items
 
-data_orders_items_total_price = (
-    data_orders_items[["id_order", "total_price"]]
-    .groupby(["id_order"], as_index=False)
-    .sum()
-)
-
-data_orders_items_total_price.columns = ["id_order", "total_items_price"]
-
-data_orders_items = data_orders_items.join(
-    data_orders_items_total_price.set_index("id_order"), how="outer", on="id_order"
-)
-
-#%%
-
-data_orders_items_unique_order = data_orders_items.drop_duplicates("id_order")
-data_orders_items_unique_order["price_matches"] = np.where(
-    data_orders_items_unique_order.total_paid
-    == data_orders_items_unique_order.total_items_price,
-    True,
-    False,
-)
+data_orders_prices = reconcile_prices(data_orders, data_items)
 
 #%% Checking the percent of orders that have the matching price
 
 # looking only at orders from the order dataset. We can use the total_paid
 # from the order dataset to achieve this
 
-data_orders_items_unique_order_price_match_ts = (
-    data_orders_items_unique_order.query("price_matches == True")
-    .dropna(subset=["total_paid"])[["created_date_norm", "id_order", "state"]]
-    .groupby(["created_date_norm", "state"])
-    .count()
-)
-
-data_orders_items_unique_order_all_ts = (
-    data_orders_items_unique_order.dropna(subset=["total_paid"])[
-        ["created_date_norm", "id_order", "state"]
-    ]
-    .groupby(["created_date_norm", "state"])
-    .count()
-)
-
-data_orders_items_unique_order_price_match_ts.columns = ["matching_orders"]
-data_orders_items_unique_order_all_ts.columns = ["all_orders"]
-
-data_orders_items_unique_order_price_match_ts = data_orders_items_unique_order_price_match_ts.join(
-    data_orders_items_unique_order_all_ts, how="left"
-)
-
-data_orders_items_unique_order_price_match_ts[
-    "percent_matching"
-] = data_orders_items_unique_order_price_match_ts.apply(
-    lambda row: round(row.matching_orders * 100 / row.all_orders), axis=1
+data_orders_items_unique_order_price_match_ts = daily_match_rate(
+    data_orders_prices.dropna(subset=["total_paid"]), by=["state"]
 )
 
-data_orders_items_unique_order_price_match_ts.reset_index(inplace=True)
-
 data_orders_items_unique_order_price_match_ts.head()
 
 #%%
@@ -393,13 +338,11 @@ plt.show()
 
 #%% Checking the distribution of the difference between prices
 
-data_price_diff = data_orders_items_unique_order.dropna(
+data_price_diff = data_orders_prices.dropna(
     subset=["total_paid", "total_items_price"]
-).query("price_matches == False")[["state", "total_paid", "total_items_price"]]
-
-data_price_diff["price_diff"] = data_price_diff.apply(
-    lambda row: row.total_paid - row.total_items_price, axis=1
-)
+).query("price_matches == False")[
+    ["state", "total_paid", "total_items_price", "price_diff"]
+]
 
 #%%
 
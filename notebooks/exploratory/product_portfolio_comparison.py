@@ -10,19 +10,19 @@ import datetime
 import copy
 from IPython.core.interactiveshell import InteractiveShell
 
+from src.data.context import get_context
+
 InteractiveShell.ast_node_interactivity = "all"
 
 #%%
 
 raw_path = os.path.join("data", "raw")
-clean_path = os.path.join("data", "clean")
 
 # Loading Electronidex data
-data_orders = pd.read_csv(
-    os.path.join(raw_path, "orders_translated.csv"), sep=";", decimal=","
-)
-data_items = pd.read_csv(os.path.join(raw_path, "lineitems.csv"), sep=";", decimal=",")
-data_categories = pd.read_csv(os.path.join(clean_path, "product_categories.csv"))
+context = get_context()
+data_orders = context.completed()
+data_items = context.lineitems()
+data_categories = context.categories()
 
 # loading Blackwell data
 data_blackwell = pd.read_csv(
@@ -34,15 +34,9 @@ data_blackwell = pd.read_csv(
 
 # Cleaning electronindex data
 
-# Keeping only the orders with state "Completed"
-data_orders.query("state == 'Completed'", inplace=True)
-
-# removing whitespace from sku for a clean join with categories
-data_items["sku"] = data_items.sku.str.strip()
-
 # Keeping only interesting columns
 data_orders.drop(columns=["state", "created_date", "total_paid"], inplace=True)
-data_items.drop(columns=["id", "product_id", "date"], inplace=True)
+data_items.drop(columns=["id", "product_id", "date", "total_price"], inplace=True)
 
 # recoding the categories in Electronindex data to match those of Blackwell
 new_categories = {
@@ -62,6 +56,8 @@ new_categories = {
 }
 
 data_categories.columns = ["sku", "category"]
+# categories are loaded dictionary encoded, but "Unknown" is added to them below
+data_categories["category"] = data_categories.category.astype(str)
 data_categories.replace(dict(category=new_categories), inplace=True)
 
 # Lets combine items to completed orders with an inner join to keep only items
@@ -463,4 +459,3 @@ plt.show()
 
 
 #%%
-
@@ -2,31 +2,29 @@
 
 import os
 
-import numpy as np
-import pandas as pd
-from tabula import read_pdf
+from src.data.cache import StageCache
+from src.data.categories import extract_categories
+from src.data.columnar import write_table
 
 #%%
 
-# loading data
+# loading data. Pages already read from this pdf are loaded from the cache
+# and the whitespace around the values is removed
 pdf_path = os.path.join("data", "raw", "products_with_category.pdf")
-data_categories = read_pdf(pdf_path, pages="all", Stream=True, guess=False)
+cache = StageCache(os.path.join("data", "processed", "cache"))
+data_categories, _ = extract_categories(pdf_path, cache)
+data_categories = data_categories()
 
 #%%
 
-# Removing whitespace around values just in cae
-data_categories.columns = ["labels", "level1"]
-data_categories["labels"] = data_categories.labels.str.strip()
-data_categories["level1"] = data_categories.level1.str.strip()
-
-#%%
-
-# Fixing spelling mistake in smartwatch
-data_categories.loc[(data_categories.level1 == "smartwhatch"), "level1"] = "smartwatch"
+# The spelling mistake in smartwatch is fixed in src.data.categories
 data_categories["level1"].value_counts()
 
 #%%
 
-# saving data
+# saving data. The csv is for the R notebooks and parquet for everything else
 file_path = os.path.join("data", "clean", "product_categories.csv")
 data_categories.to_csv(file_path, index=False)
+write_table(
+    data_categories, os.path.join("data", "clean", "product_categories.parquet")
+)
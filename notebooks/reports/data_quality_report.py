@@ -34,6 +34,10 @@ import sklearn
 from IPython.core.interactiveshell import InteractiveShell
 from IPython.display import HTML
 
+from src.data.context import get_context
+from src.data.quality import reconcile_prices
+from src.data.transactions import read_transactions
+
 # Setting styles
 sns.set(style="whitegrid", color_codes=True)
 InteractiveShell.ast_node_interactivity = "all"
@@ -42,15 +46,11 @@ InteractiveShell.ast_node_interactivity = "all"
 
 raw_path = os.path.join("data", "raw")
 
-# for trans we do not want the header
-data_trans = pd.read_csv(
-    os.path.join(raw_path, "trans.csv"), skiprows=1, header=None, sep="\n"
-)
-data_trans = data_trans[0].str.split(",", expand=True)
-data_orders = pd.read_csv(
-    os.path.join(raw_path, "orders_translated.csv"), sep=";", decimal=","
-)
-data_items = pd.read_csv(os.path.join(raw_path, "lineitems.csv"), sep=";", decimal=",")
+# the baskets of trans.csv as a sparse matrix of item ids
+transactions = read_transactions(os.path.join(raw_path, "trans.csv"))
+context = get_context()
+data_orders = context.orders()
+data_items = context.lineitems()
 
 
 #%% [markdown]
@@ -71,7 +71,7 @@ The rows in the trans.csv are completed transactions with more than one unique p
 # Sample data
 data_orders.head()
 data_items.head()
-data_trans.head()
+[transactions.basket(t) for t in range(5)]
 
 #%% [markdown]
 """
@@ -83,7 +83,7 @@ that are just the orders with two or more unique products.
 #%%
 
 rows_list = [
-    ("Transactions", len(data_trans)),
+    ("Transactions", len(transactions)),
     ("Orders", len(data_orders)),
     ("Items", len(data_items)),
 ]
@@ -110,8 +110,9 @@ the completed orders.
 """
 #%%
 
-# Number of missing values
-data_trans.isnull().sum().plot(kind="bar")
+# Number of missing values, the transactions with fewer items than the
+# column number + 1
+pd.Series(np.bincount(transactions.basket_sizes()).cumsum()[:-1]).plot(kind="bar")
 plt.title("Transactions Missing by Columns")
 plt.show()
 data_orders.isnull().sum().plot(kind="bar")
@@ -134,10 +135,6 @@ All the rows in orders and items datasets timestamps are within our designated p
 """
 #%%
 
-# correcting the datetime columns
-data_orders.created_date = pd.to_datetime(data_orders.created_date)
-data_items.date = pd.to_datetime(data_items.date)
-
 # adding normalized versions for easier handling
 data_orders["created_date_norm"] = data_orders["created_date"].dt.normalize()
 data_items["date_norm"] = data_items["date"].dt.normalize()
@@ -242,9 +239,8 @@ Luckily again it seems that all these problematic orders are in state "Place ord
 #%%
 
 # Lets combine the orders and items with an inner join
-data_orders_items = data_orders.join(
-    data_items.set_index("id_order"), how="outer", on="id_order", lsuffix="_item"
-)
+data_orders_items = context.orders_items()
+data_orders_items["created_date_norm"] = data_orders_items.created_date.dt.normalize()
 
 # We use columns that don't have missing and only appear in one of the datasets to do check join quality
 print(
@@ -302,71 +298,41 @@ probably true errors.
 """
 #%%
 
-# Adding total price to items that takes into account the number of items
-data_orders_items["total_orders_price"] = (
-    data_orders_items["unit_price"] * data_orders_items["product_quantity"]
-)
-
-# Adding order price calculated from items within order to the joined dataset
-data_orders_items_total_price = (
-    data_orders_items[["id_order", "total_orders_price"]]
-    .groupby(["id_order"], as_index=False)
-    .sum()
-)
-
-data_orders_items_total_price.columns = ["id_order", "total_order_price"]
-
-data_completed_orders = (
-    data_orders_items.join(
-        data_orders_items_total_price.set_index("id_order"), how="left", on="id_order"
-    )
-    .query("state == 'Completed'")
-    .drop_duplicates(subset="id_order")[
-        [
-            "id_order",
-            "created_date",
-            "created_date_norm",
-            "total_paid",
-            "total_order_price",
-        ]
-    ]
+# Comparing the price paid for every completed order to the sum of the prices
+# of its items
+data_completed_orders = reconcile_prices(
+    data_orders[data_orders.state == "Completed"], data_items
 )
+data_completed_orders["created_date_norm"] = data_completed_orders[
+    "created_date"
+].dt.normalize()
 
 # Checking percent matching
 print(
     "Percent of completed orders with a matching total paid and sum of item prices: ",
-    np.round(
-        data_completed_orders.query("total_paid == total_order_price").shape[0]
-        * 100
-        / data_completed_orders.shape[0]
-    ),
+    np.round(data_completed_orders.price_matches.mean() * 100),
     "%",
 )
 
-
-data_completed_orders["matching_price"] = (
-    data_completed_orders.total_paid == data_completed_orders.total_order_price
-)
-
 # Creating a timeline plot of the sum of both of the prices
 data_completed_orders_ts = (
     data_completed_orders[
-        ["created_date_norm", "total_paid", "total_order_price", "matching_price"]
+        ["created_date_norm", "total_paid", "total_items_price", "price_matches"]
     ]
     .groupby(["created_date_norm"])
     .agg(
         {
             "total_paid": ["sum"],
-            "total_order_price": ["sum"],
-            "matching_price": ["sum", "count"],
+            "total_items_price": ["sum"],
+            "price_matches": ["sum", "count"],
         }
     )
 )
 
 data_completed_orders_ts["matching_prices_percent"] = (
-    data_completed_orders_ts.matching_price["sum"]
+    data_completed_orders_ts.price_matches["sum"]
     .multiply(100)
-    .divide(data_completed_orders_ts.matching_price["count"])
+    .divide(data_completed_orders_ts.price_matches["count"])
     .round(1)
 )
 
@@ -391,7 +357,7 @@ sns.lineplot(
 )
 sns.lineplot(
     data_completed_orders_ts.index,
-    data_completed_orders_ts.total_order_price["sum"],
+    data_completed_orders_ts.total_items_price["sum"],
     color="b",
     ax=ax,
 )
@@ -405,12 +371,8 @@ plt.title(
 plt.show()
 
 data_price_diff = data_completed_orders.dropna(
-    subset=["total_paid", "total_order_price"]
-).query("matching_price == False")[["total_paid", "total_order_price"]]
-
-data_price_diff["price_diff"] = data_price_diff.apply(
-    lambda row: row.total_paid - row.total_order_price, axis=1
-)
+    subset=["total_paid", "total_items_price"]
+).query("price_matches == False")[["total_paid", "total_items_price", "price_diff"]]
 
 print("Minimum price difference: ", data_price_diff.price_diff.min().round())
 print("Maximum price difference: ", data_price_diff.price_diff.max().round())
@@ -491,7 +453,7 @@ rows_list = [
         "Completed Orders with\n 2 or More Unique Items",
         data_orders_items_ts.two_or_more.sum(),
     ),
-    ("Transactions", data_trans.shape[0]),
+    ("Transactions", len(transactions)),
 ]
 labels_list = ["Dataset", "Rows"]
 
@@ -514,5 +476,5 @@ print(
     "Rows in Completed Orders with 2 or More Unique Items: ",
     data_orders_items_ts.two_or_more.sum(),
 )
-print("Rows in Transaction Dataset: ", data_trans.shape[0])
+print("Rows in Transaction Dataset: ", len(transactions))
 
@@ -0,0 +1,134 @@
+"""
+.. module:: cache.py
+    :synopsis: Content addressed cache for the outputs of pipeline stages.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from src.data.columnar import read_table, write_table
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(*parts):
+    """ Returns a short hex digest of ``parts``. Parts are anything that
+        json can serialize, such as stage names, parameters and the keys
+        of upstream stages.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def file_digest(filepath, block_size=1 << 20):
+    """ Returns the sha256 hex digest of the contents of ``filepath``.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """ Stores stage outputs in ``cache_dir`` as ``<stage>-<key>.parquet``.
+
+    The key of a stage is a hash of everything its output depends on, so
+    an output found under the current key is up to date and the stage can
+    be skipped. Only the newest output of every stage is kept.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._digests_path = self.cache_dir / "digests.json"
+        self._digests = self._read_json(self._digests_path)
+        self._published_path = self.cache_dir / "published.json"
+        self._published = self._read_json(self._published_path)
+
+    @staticmethod
+    def _read_json(path):
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_json(path, data):
+        # written next to the file and moved in place, so that an
+        # interrupted run never leaves a truncated index behind
+        temporary = str(path) + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temporary, str(path))
+
+    def path(self, stage, key):
+        return self.cache_dir / "{}-{}.parquet".format(stage, key)
+
+    def file_key(self, filepath):
+        """ Returns the content digest of an input file. Digests are
+            remembered by file size and modification time so unchanged
+            inputs are not read again.
+        """
+        filepath = Path(filepath).resolve()
+        stat = filepath.stat()
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = self._digests.get(str(filepath))
+        if known is not None and known[:2] == stamp:
+            return known[2]
+
+        digest = file_digest(filepath)
+        self._digests[str(filepath)] = stamp + [digest]
+        self._write_json(self._digests_path, self._digests)
+        return digest
+
+    def stage(self, stage, key, compute, force=False):
+        """ Returns a function that loads the cached output of ``stage``
+            under ``key``, or computes it with ``compute()`` and stores it.
+            The output is only loaded or computed on the first call, so
+            stages that nothing downstream needs are never read. Calling
+            the function with ``columns`` loads only those columns.
+        """
+        path = self.path(stage, key)
+        # a forced stage is computed once and then read like any other
+        rerun = [force]
+
+        @lru_cache(maxsize=None)
+        def load(columns):
+            if path.exists() and not rerun[0]:
+                logger.info("stage %s is up to date (%s)", stage, key)
+                return read_table(path, columns)
+
+            logger.info("running stage %s (%s)", stage, key)
+            data = compute()
+            write_table(data, path)
+            rerun[0] = False
+            for stale in self.cache_dir.glob("{}-*.parquet".format(stage)):
+                if stale != path:
+                    stale.unlink()
+            return data if columns is None else data[list(columns)]
+
+        def output(columns=None):
+            return load(None if columns is None else tuple(columns))
+
+        return output
+
+    def publish(self, filepath, key, write, force=False):
+        """ Writes a final data set with ``write(filepath)`` unless the file
+            was already written from the stage output under ``key``.
+        """
+        filepath = Path(filepath)
+        if filepath.exists() and not force:
+            if self._published.get(str(filepath.resolve())) == key:
+                logger.info("%s is up to date (%s)", filepath, key)
+                return
+
+        logger.info("writing %s (%s)", filepath, key)
+        write(filepath)
+        self._published[str(filepath.resolve())] = key
+        self._write_json(self._published_path, self._published)
@@ -0,0 +1,227 @@
+"""
+.. module:: categories.py
+    :synopsis: Product categories read from the pdf, cached page by page.
+
+"""
+
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from types import MappingProxyType
+
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.cache import StageCache, hash_key
+from src.data.columnar import read_table, write_table
+
+logger = logging.getLogger(__name__)
+
+# misspelled categories of the pdf and their fixes
+SPELLING = {"smartwhatch": "smartwatch"}
+
+
+def count_pages(pdf_path):
+    """ Returns the number of pages of a pdf from the count of its page
+        tree, or None when the page tree is compressed.
+    """
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+    counts = [
+        int(count)
+        for tree in re.findall(rb"<<[^<>]*/Type\s*/Pages\b[^<>]*>>", data)
+        for count in re.findall(rb"/Count\s+(\d+)", tree)
+    ]
+    return max(counts) if counts else None
+
+
+def _page_table(data):
+    """ Returns the skus and categories of a table tabula read from a page.
+    """
+    if data is None or data.empty:
+        return pd.DataFrame({"labels": [], "level1": []}, dtype=object)
+    data = data.iloc[:, :2]
+    data.columns = ["labels", "level1"]
+    # the header of the table is on the first page only
+    return data[data.labels.str.strip() != "sku"].reset_index(drop=True)
+
+
+def read_page(pdf_path, page):
+    """ Reads the skus and categories on ``page`` of the pdf with tabula.
+    """
+    # imported here so that nothing starts java when every page is cached
+    from tabula import read_pdf
+
+    return _page_table(
+        read_pdf(
+            str(pdf_path),
+            pages=page,
+            Stream=True,
+            guess=False,
+            pandas_options={"header": None, "dtype": str},
+        )
+    )
+
+
+def read_pages(pdf_path, first, last):
+    """ Reads the skus and categories on pages ``first`` to ``last`` of
+        the pdf with one tabula run and returns them page by page.
+    """
+    from tabula import read_pdf
+
+    tables = read_pdf(
+        str(pdf_path),
+        pages="{}-{}".format(first, last),
+        Stream=True,
+        guess=False,
+        multiple_tables=True,
+        pandas_options={"header": None, "dtype": str},
+    )
+    # without guessing tabula finds one table on every page, if it did
+    # not the tables cannot be told apart by page
+    if tables is None or len(tables) != last - first + 1:
+        logger.warning("reading pages %s-%s one at a time", first, last)
+        return [read_page(pdf_path, page) for page in range(first, last + 1)]
+    return [_page_table(data) for data in tables]
+
+
+def clean_categories(data_categories):
+    """ Strips whitespace around the values and fixes misspelled
+        categories.
+    """
+    data_categories = pd.DataFrame(
+        {
+            "labels": data_categories.labels.astype(str).str.strip(),
+            "level1": data_categories.level1.astype(str).str.strip(),
+        }
+    )
+    data_categories["level1"] = data_categories.level1.replace(SPELLING)
+    return data_categories.reset_index(drop=True)
+
+
+def extract_categories(pdf_path, cache, n_jobs=4, force=False):
+    """ Returns the product categories of the pdf, cached in the
+        :class:`src.data.cache.StageCache` ``cache``, and their key.
+
+    The table is cached under the content digest of the pdf, so an
+    unchanged pdf is neither hashed again nor parsed. When it changed,
+    every page is cached on its own, so an interrupted run continues
+    where it stopped. The pages missing from the cache are split into
+    ``n_jobs`` ranges of consecutive pages that are read in parallel
+    with one tabula run each, instead of starting java for every page.
+    """
+    digest = cache.file_key(pdf_path)
+    key = hash_key("categories", digest, SPELLING)
+
+    def page_stage(page):
+        return "category_page_{}".format(page), hash_key("category_page", digest, page)
+
+    def read_all():
+        n_pages = count_pages(pdf_path)
+        if not n_pages:
+            load = cache.stage(
+                *page_stage("all"), partial(read_page, pdf_path, "all"), force
+            )
+            return clean_categories(load())
+
+        pages = list(range(1, n_pages + 1))
+        missing = np.array(
+            [
+                page
+                for page in pages
+                if force or not cache.path(*page_stage(page)).exists()
+            ],
+            dtype=np.int64,
+        )
+        # every worker starts java once for a range of consecutive pages
+        ranges = [
+            run
+            for chunk in np.array_split(missing, min(n_jobs, len(missing)) or 1)
+            for run in np.split(chunk, np.flatnonzero(np.diff(chunk) > 1) + 1)
+            if len(run)
+        ]
+        read = {}
+
+        def read_range(run):
+            first, last = int(run[0]), int(run[-1])
+            read.update(zip(range(first, last + 1), read_pages(pdf_path, first, last)))
+
+        with ThreadPoolExecutor(n_jobs) as pool:
+            list(pool.map(read_range, ranges))
+        parts = [
+            cache.stage(*page_stage(page), partial(read.pop, page), force)()
+            for page in pages
+        ]
+        return clean_categories(pd.concat(parts, ignore_index=True))
+
+    return cache.stage("categories", key, read_all, force), key
+
+
+@lru_cache(maxsize=None)
+def _lookup(filepath, stamp):
+    data_categories = read_table(filepath, ["labels", "level1"])
+    data_categories = data_categories.drop_duplicates("labels")
+    return MappingProxyType(
+        dict(
+            zip(data_categories.labels.astype(str), data_categories.level1.astype(str))
+        )
+    )
+
+
+def category_lookup(
+    filepath=os.path.join("data", "clean", "product_categories.parquet")
+):
+    """ Returns a read only sku -> category mapping of the published
+        categories.
+
+    The mapping is read once and then shared until the file changes, so
+    later calls only cost a ``stat`` of the file.
+    """
+    return _lookup(str(filepath), os.stat(str(filepath)).st_mtime_ns)
+
+
+@click.command()
+@click.argument("pdf_filepath", type=click.Path(exists=True))
+@click.argument("output_filepath", type=click.Path())
+@click.option(
+    "--cache-dir",
+    type=click.Path(),
+    default=os.path.join("data", "processed", "cache"),
+    help="Where the pages read from the pdf are cached.",
+)
+@click.option("--n-jobs", default=4, help="Pages read at the same time.")
+@click.option("--force", is_flag=True, help="Read the pdf again ignoring the cache.")
+def main(pdf_filepath, output_filepath, cache_dir, n_jobs, force):
+    """ Reads the product categories from the pdf and saves them to
+        OUTPUT_FILEPATH (../clean). The csv is for the R notebooks and the
+        parquet for everything else.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("reading product categories from %s", pdf_filepath)
+
+    output_path = Path(output_filepath)
+    cache = StageCache(cache_dir)
+    data_categories, key = extract_categories(pdf_filepath, cache, n_jobs, force)
+    cache.publish(
+        output_path / "product_categories.parquet",
+        key,
+        lambda path: write_table(data_categories(), path),
+        force,
+    )
+    cache.publish(
+        output_path / "product_categories.csv",
+        key,
+        lambda path: data_categories().to_csv(path, index=False),
+        force,
+    )
+
+
+if __name__ == "__main__":
+    log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
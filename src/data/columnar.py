@@ -0,0 +1,80 @@
+"""
+.. module:: columnar.py
+    :synopsis: Typed and compressed Parquet files for intermediate data.
+
+"""
+
+import os
+from pathlib import Path
+
+import pandas as pd
+
+
+def _dictionary_encode(data, max_ratio=0.5):
+    """ Converts the string columns of ``data`` that repeat their values,
+        such as skus, states and categories, to categoricals so they are
+        stored and loaded dictionary encoded.
+    """
+    data = data.copy(deep=False)
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if not pd.api.types.is_string_dtype(values.dtype):
+            continue
+        sample = values.dropna()
+        if sample.empty or not isinstance(sample.iloc[0], str):
+            continue
+        if values.nunique() <= max_ratio * len(values):
+            data[column] = values.astype("category")
+    return data
+
+
+def write_table(data, filepath, compression="zstd"):
+    """ Writes ``data`` to a Parquet file.
+
+    Dates are kept as timestamps, repeating strings are dictionary encoded
+    and list columns such as baskets are stored as Parquet lists. The file
+    is written next to its final path first and then moved in place, so
+    readers never see a partially written file.
+    """
+    filepath = str(filepath)
+    temporary = filepath + ".tmp"
+    _dictionary_encode(data).to_parquet(
+        temporary, engine="pyarrow", compression=compression, index=False
+    )
+    os.replace(temporary, filepath)
+
+
+def read_table(filepath, columns=None):
+    """ Reads a Parquet file written with :func:`write_table`, loading only
+        ``columns`` when given.
+    """
+    if columns is not None:
+        columns = list(columns)
+    return pd.read_parquet(str(filepath), engine="pyarrow", columns=columns)
+
+
+def _partition_path(directory, column, key):
+    return Path(directory) / "{}={}.parquet".format(column, key)
+
+
+def write_partitions(data, directory, column):
+    """ Writes ``data`` to one Parquet file in ``directory`` per value of
+        ``column``, replacing the partitions of those values only.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for key, part in data.groupby(column, sort=False):
+        write_table(part, _partition_path(directory, column, key))
+
+
+def read_partitions(directory, column, keys, columns):
+    """ Reads the partitions of the ``keys`` of ``column`` written with
+        :func:`write_partitions`, loading only ``columns``. Keys without a
+        partition have no rows.
+    """
+    paths = [_partition_path(directory, column, key) for key in keys]
+    parts = [read_table(path, columns) for path in paths if path.exists()]
+    if not parts:
+        return pd.DataFrame(columns=list(columns))
+    return pd.concat(parts, ignore_index=True)
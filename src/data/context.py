@@ -0,0 +1,187 @@
+"""
+.. module:: context.py
+    :synopsis: Lazily built and cached data frames shared by the notebooks.
+
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from src.data.cache import StageCache, hash_key
+from src.data.columnar import read_table
+from src.data.make_datasets import (
+    aggregate_items,
+    enrich_transactions,
+    filter_completed,
+    load_lineitems,
+    load_orders,
+)
+
+
+class DataContext:
+    """ The raw data and the frames derived from it, built when first asked
+        for.
+
+    Every frame is a stage of a :class:`src.data.cache.StageCache` in
+    ``cache_dir`` whose key is derived from the digests of the raw files,
+    so a frame is built once, kept in memory for the rest of the session
+    and read back from disk by every later session until the raw files
+    change. The stages shared with :mod:`src.data.make_datasets` have
+    the same keys, so the frames built by ``make data`` are reused too.
+    Frames are returned as copies that can be changed freely.
+    """
+
+    def __init__(
+        self,
+        raw_path=os.path.join("data", "raw"),
+        cache_dir=os.path.join("data", "processed", "cache"),
+        clean_path=os.path.join("data", "clean"),
+        force=False,
+    ):
+        self.raw_path = Path(raw_path)
+        self.clean_path = Path(clean_path)
+        self.cache = StageCache(cache_dir)
+        self.force = force
+        self._stages = {}
+
+    def __repr__(self):
+        return "<DataContext: {} ({} frames built)>".format(
+            self.raw_path, len(self._stages)
+        )
+
+    def _stage(self, stage, key, compute):
+        """ Returns the key and the loader of ``stage``, defining it again
+            when its key changed because a raw file did.
+        """
+        if stage not in self._stages or self._stages[stage][0] != key:
+            loader = self.cache.stage(stage, key, compute, self.force)
+            self._stages[stage] = (key, loader)
+        return self._stages[stage]
+
+    def _orders(self):
+        filepath = self.raw_path / "orders_translated.csv"
+        key = hash_key("orders", self.cache.file_key(filepath))
+        return self._stage("orders", key, lambda: load_orders(filepath))
+
+    def _lineitems(self):
+        filepath = self.raw_path / "lineitems.csv"
+        key = hash_key("lineitems", self.cache.file_key(filepath))
+        return self._stage("lineitems", key, lambda: load_lineitems(filepath))
+
+    def _completed(self):
+        orders_key, orders = self._orders()
+        key = hash_key("completed", orders_key, "Completed")
+        return self._stage("completed", key, lambda: filter_completed(orders()))
+
+    def _items_agg(self):
+        lineitems_key, lineitems = self._lineitems()
+        key = hash_key("items_agg", lineitems_key)
+        return self._stage(
+            "items_agg",
+            key,
+            lambda: aggregate_items(
+                lineitems(["id_order", "total_price", "product_quantity"])
+            ),
+        )
+
+    def _orders_items(self):
+        orders_key, orders = self._orders()
+        lineitems_key, lineitems = self._lineitems()
+        key = hash_key("orders_items", orders_key, lineitems_key)
+        return self._stage(
+            "orders_items",
+            key,
+            lambda: orders().join(
+                lineitems().set_index("id_order"),
+                how="outer",
+                on="id_order",
+                lsuffix="_item",
+            ),
+        )
+
+    def _completed_items(self):
+        completed_key, completed = self._completed()
+        lineitems_key, lineitems = self._lineitems()
+        key = hash_key("completed_items", completed_key, lineitems_key)
+        return self._stage(
+            "completed_items",
+            key,
+            lambda: completed().join(
+                lineitems().set_index("id_order"), how="inner", on="id_order"
+            ),
+        )
+
+    def _trans_enriched(self):
+        completed_key, completed = self._completed()
+        items_agg_key, items_agg = self._items_agg()
+        lineitems_key, lineitems = self._lineitems()
+        key = hash_key("trans_enriched", completed_key, items_agg_key, lineitems_key)
+        return self._stage(
+            "trans_enriched",
+            key,
+            lambda: enrich_transactions(
+                completed(), items_agg(), lineitems(["id_order", "sku"])
+            ),
+        )
+
+    def _frame(self, stage, columns):
+        _, loader = getattr(self, "_" + stage)()
+        return loader(columns).copy()
+
+    def orders(self, columns=None):
+        """ Returns the orders, see :func:`src.data.tables.read_orders`.
+        """
+        return self._frame("orders", columns)
+
+    def lineitems(self, columns=None):
+        """ Returns the line items with their total prices.
+        """
+        return self._frame("lineitems", columns)
+
+    def completed(self, columns=None):
+        """ Returns the completed orders.
+        """
+        return self._frame("completed", columns)
+
+    def items_agg(self, columns=None):
+        """ Returns the prices and quantities of the line items summed per
+            order.
+        """
+        return self._frame("items_agg", columns)
+
+    def orders_items(self, columns=None):
+        """ Returns all orders and line items joined on ``id_order``,
+            keeping the orders without items and the items without an order.
+        """
+        return self._frame("orders_items", columns)
+
+    def completed_items(self, columns=None):
+        """ Returns the line items of the completed orders joined with their
+            order.
+        """
+        return self._frame("completed_items", columns)
+
+    def trans_enriched(self, columns=None):
+        """ Returns the transactions with their order information, see
+            :func:`src.data.make_datasets.enrich_transactions`.
+        """
+        return self._frame("trans_enriched", columns)
+
+    def categories(self):
+        """ Returns the product categories read from the pdf, see
+            :mod:`src.data.categories`.
+        """
+        return read_table(self.clean_path / "product_categories.parquet")
+
+
+@lru_cache(maxsize=None)
+def get_context(
+    raw_path=os.path.join("data", "raw"),
+    cache_dir=os.path.join("data", "processed", "cache"),
+    clean_path=os.path.join("data", "clean"),
+):
+    """ Returns the :class:`DataContext` of the paths, the same one for
+        every notebook run in the same session.
+    """
+    return DataContext(raw_path, cache_dir, clean_path)
@@ -6,20 +6,188 @@
 
 import click
 import logging
+import os
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
 
+import pandas as pd
+
+from src.data.cache import StageCache, hash_key
+from src.data.columnar import read_table, write_table
+from src.data.tables import read_lineitems, read_orders
+from src.data.transactions import baskets_from_lineitems
+
+
+def load_orders(filepath):
+    """ Reads the orders, see :func:`src.data.tables.read_orders`.
+    """
+    return read_orders(filepath)
+
+
+def load_lineitems(filepath):
+    """ Reads the items of the orders and adds their total price taking into
+        account the number of items.
+    """
+    data_items = read_lineitems(filepath)
+    data_items["total_price"] = data_items.unit_price * data_items.product_quantity
+    return data_items
+
+
+def filter_completed(data_orders, state="Completed"):
+    """ Keeps only the orders in ``state``.
+    """
+    return data_orders[data_orders.state == state].reset_index(drop=True)
+
+
+def aggregate_items(data_items):
+    """ Aggregates the items to orders.
+    """
+    data_items_agg = data_items.groupby("id_order").agg(
+        {"total_price": ["sum"], "product_quantity": ["sum", "count"]}
+    )
+    data_items_agg.columns = [
+        "total_items_price",
+        "total_items_quantity",
+        "n_unique_products",
+    ]
+    return data_items_agg.reset_index()
+
+
+def enrich_transactions(data_completed, data_items_agg, data_items, min_products=2):
+    """ Builds the transactions of the completed orders with at least
+        ``min_products`` products together with the order information.
+
+    Baskets are rebuilt from the line items and the order information is
+    joined on ``id_order``, so nothing depends on the rows of the
+    datasets being in the same order.
+    """
+    completed_items = data_items[data_items.id_order.isin(data_completed.id_order)]
+    order_ids, transactions = baskets_from_lineitems(completed_items, min_products)
+    data_trans = pd.DataFrame(
+        {
+            "items": [transactions.basket(t) for t in range(len(transactions))],
+            "id_order": order_ids,
+        }
+    )
+
+    data_orders_items = data_completed.merge(data_items_agg, how="inner", on="id_order")
+    data_trans_enriched = data_trans.merge(
+        data_orders_items, how="left", on="id_order", validate="one_to_one"
+    )
+    data_trans_enriched["total_items_quantity"] = data_trans_enriched[
+        "total_items_quantity"
+    ].astype(int)
+    data_trans_enriched["n_unique_products"] = data_trans_enriched[
+        "n_unique_products"
+    ].astype(int)
+    return data_trans_enriched
+
+
+def resolve_categories(data_items, data_categories, unknown="unknown"):
+    """ Adds the product category of every item, ``unknown`` when the sku
+        has no category.
+    """
+    data_categories = data_categories.rename(
+        columns={"labels": "sku", "level1": "category"}
+    )
+    data_items = data_items.merge(
+        data_categories[["sku", "category"]].drop_duplicates("sku"),
+        how="left",
+        on="sku",
+    )
+    data_items["category"] = data_items.category.fillna(unknown)
+    return data_items
+
 
 @click.command()
 @click.argument("input_filepath", type=click.Path(exists=True))
 @click.argument("output_filepath", type=click.Path())
-def main(input_filepath, output_filepath):
+@click.option(
+    "--categories-filepath",
+    type=click.Path(),
+    default=os.path.join("data", "clean", "product_categories.parquet"),
+    help="Product categories read from the pdf.",
+)
+@click.option("--force", is_flag=True, help="Rerun all stages ignoring the cache.")
+def main(input_filepath, output_filepath, categories_filepath, force):
     """ Runs data processing scripts to turn raw data from (../raw) trough
         all processing steps (saved in ../processed).
+
+    Every stage output is cached in ../processed/cache under a hash of its
+    inputs and parameters, so only stages whose inputs changed are rerun.
+    Stage outputs and final data sets are Parquet files.
     """
     logger = logging.getLogger(__name__)
     logger.info("making final data sets from raw data")
 
+    raw_path = Path(input_filepath)
+    processed_path = Path(output_filepath)
+    cache = StageCache(processed_path / "cache")
+
+    orders_filepath = raw_path / "orders_translated.csv"
+    lineitems_filepath = raw_path / "lineitems.csv"
+
+    # stage keys are cheap to compute up front, the stage outputs are only
+    # loaded or computed when a stage downstream of them has to run
+    orders_key = hash_key("orders", cache.file_key(orders_filepath))
+    lineitems_key = hash_key("lineitems", cache.file_key(lineitems_filepath))
+    completed_key = hash_key("completed", orders_key, "Completed")
+    items_agg_key = hash_key("items_agg", lineitems_key)
+    trans_enriched_key = hash_key(
+        "trans_enriched", completed_key, items_agg_key, lineitems_key
+    )
+
+    data_orders = cache.stage(
+        "orders", orders_key, lambda: load_orders(orders_filepath), force
+    )
+    data_items = cache.stage(
+        "lineitems", lineitems_key, lambda: load_lineitems(lineitems_filepath), force
+    )
+    data_completed = cache.stage(
+        "completed", completed_key, lambda: filter_completed(data_orders()), force
+    )
+    data_items_agg = cache.stage(
+        "items_agg",
+        items_agg_key,
+        lambda: aggregate_items(
+            data_items(["id_order", "total_price", "product_quantity"])
+        ),
+        force,
+    )
+    data_trans_enriched = cache.stage(
+        "trans_enriched",
+        trans_enriched_key,
+        lambda: enrich_transactions(
+            data_completed(), data_items_agg(), data_items(["id_order", "sku"]),
+        ),
+        force,
+    )
+    cache.publish(
+        processed_path / "trans_enriched.parquet",
+        trans_enriched_key,
+        lambda path: write_table(data_trans_enriched(), path),
+        force,
+    )
+
+    if not os.path.exists(categories_filepath):
+        logger.warning("no product categories in %s", categories_filepath)
+        return
+    items_categorized_key = hash_key(
+        "items_categorized", lineitems_key, cache.file_key(categories_filepath)
+    )
+    data_items_categorized = cache.stage(
+        "items_categorized",
+        items_categorized_key,
+        lambda: resolve_categories(data_items(), read_table(categories_filepath)),
+        force,
+    )
+    cache.publish(
+        processed_path / "lineitems_categorized.parquet",
+        items_categorized_key,
+        lambda path: write_table(data_items_categorized(), path),
+        force,
+    )
+
 
 if __name__ == "__main__":
     log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
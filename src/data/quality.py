@@ -0,0 +1,91 @@
+"""
+.. module:: quality.py
+    :synopsis: Reconciliation of the prices paid with the prices of the items.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def item_totals(data_items):
+    """ Returns the price of the items of every order,
+        ``unit_price * product_quantity`` summed per ``id_order``, and the
+        number of its items without a price.
+
+    The orders are factorized once and the prices summed with one
+    ``np.bincount``, which is linear in the number of line items. Items
+    without a unit price are left out of the sum instead of making the
+    whole total missing, and are counted in ``unpriced_items``.
+    """
+    codes, orders = pd.factorize(data_items.id_order)
+    prices = (data_items.unit_price * data_items.product_quantity).to_numpy()
+    known = codes >= 0
+    unpriced = np.isnan(prices)
+    totals = np.bincount(
+        codes[known], weights=np.nan_to_num(prices[known]), minlength=len(orders)
+    )
+    return pd.DataFrame(
+        {
+            "total_items_price": totals,
+            "unpriced_items": np.bincount(
+                codes[known & unpriced], minlength=len(orders)
+            ),
+        },
+        index=pd.Index(orders, name="id_order"),
+    )
+
+
+def match_prices(data_orders, totals, tolerance=0.005):
+    """ Returns every order of ``data_orders`` with the price of its items,
+        the difference ``total_paid - total_items_price`` and whether the
+        prices match, from ``totals`` as returned by :func:`item_totals`.
+
+    Prices match when they differ by less than ``tolerance``, half a cent
+    by default, because sums of floating point prices are not exact.
+    Orders without items have no items price and never match. Orders
+    with items without a unit price cannot be checked: they never match
+    either, and ``unpriced_items`` tells them apart from the orders whose
+    prices really differ.
+    """
+    columns = [
+        column
+        for column in ("id_order", "created_date", "state", "total_paid")
+        if column in data_orders.columns
+    ]
+    data = data_orders[columns].reset_index(drop=True)
+    totals = totals.reindex(data.id_order.to_numpy())
+    data["total_items_price"] = totals.total_items_price.to_numpy()
+    data["unpriced_items"] = totals.unpriced_items.fillna(0).to_numpy(np.int64)
+    data["price_diff"] = data.total_paid - data.total_items_price
+    data["price_matches"] = (
+        (data.price_diff.abs() < tolerance) & (data.unpriced_items == 0)
+    ).to_numpy()
+    return data
+
+
+def reconcile_prices(data_orders, data_items, tolerance=0.005):
+    """ Returns every order of ``data_orders`` with the price of its items
+        in ``data_items``, see :func:`match_prices`.
+    """
+    return match_prices(data_orders, item_totals(data_items), tolerance)
+
+
+def daily_match_rate(data_prices, by=()):
+    """ Returns the number of orders, the number of orders whose prices
+        match and their percentage per day of ``created_date`` and per the
+        ``by`` columns of the output of :func:`reconcile_prices`.
+
+    Days without a single matching order are kept with a zero percentage.
+    """
+    keys = [data_prices.created_date.dt.normalize().rename("created_date_norm")]
+    keys += [data_prices[column] for column in by]
+    grouped = data_prices.price_matches.groupby(keys, observed=True)
+    data = pd.DataFrame(
+        {
+            "matching_orders": grouped.sum().astype(np.int64),
+            "all_orders": grouped.size(),
+        }
+    )
+    data["percent_matching"] = data.matching_orders * 100 / data.all_orders
+    return data.reset_index()
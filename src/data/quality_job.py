@@ -0,0 +1,377 @@
+"""
+.. module:: quality_job.py
+    :synopsis: Data quality checks of the orders and items, day by day.
+
+"""
+
+import hashlib
+import io
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from src.data.columnar import read_partitions, read_table, write_partitions, write_table
+from src.data.quality import item_totals, match_prices
+from src.data.tables import read_lineitems, read_orders
+
+logger = logging.getLogger(__name__)
+
+SOURCES = {"orders": "orders_translated.csv", "items": "lineitems.csv"}
+
+CHECK_COLUMNS = [
+    "n_orders",
+    "null_total_paid",
+    "zero_total_paid",
+    "duplicate_order_ids",
+    "orders_without_items",
+    "completed_orders",
+    "matching_completed_orders",
+    "n_items",
+    "orphan_items",
+    "null_unit_price",
+    "negative_unit_price",
+    "duplicate_item_ids",
+]
+
+ORDER_COLUMNS = ["id_order", "day", "state", "total_paid"]
+
+ITEM_COLUMNS = ["id", "id_order", "day", "unit_price"]
+
+SUMMARY_COLUMNS = ["n_orders", "n_items", "total_items_price", "unpriced_items"]
+
+
+def _day_keys(dates):
+    """ Returns the day of every timestamp as an integer, missing dates
+        being a day of their own.
+    """
+    # a source without new lines gives an empty column that is not parsed
+    dates = pd.to_datetime(dates)
+    return dates.dt.normalize().to_numpy().astype("datetime64[ns]").view(np.int64)
+
+
+def _prefix_digest(filepath, offset, block_size=1 << 20):
+    """ Returns the digest of the first ``offset`` bytes of ``filepath``.
+    """
+    digest = hashlib.sha256()
+    with open(str(filepath), "rb") as f:
+        while offset > 0:
+            block = f.read(min(block_size, offset))
+            if not block:
+                break
+            digest.update(block)
+            offset -= len(block)
+    return digest.hexdigest()
+
+
+def read_appended(filepath, offset, read):
+    """ Reads the complete lines of ``filepath`` after byte ``offset``, 0
+        for the whole file, with ``read`` and returns them with the offset
+        where they end.
+    """
+    with open(str(filepath), "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    # a line that is still being written is read on the next run
+    end = data.rfind(b"\n") + 1
+    return read(io.BytesIO(header + data[:end])), max(offset, len(header)) + end
+
+
+class QualityState:
+    """ What the checks of the days already checked depend on, kept in
+        ``directory``.
+
+    The rows of the orders and items are stored by day with
+    :func:`src.data.columnar.write_partitions`. ``order_ids`` sums up
+    every ``id_order`` over all days: how many orders and items have it,
+    the price of those items and how many of them have no price. These
+    sums only grow, so new rows are added to them without reading the
+    old rows. ``order_days`` and ``item_days`` tell the days on which
+    every ``id_order`` and item ``id`` occur, which are the days whose
+    checks change when new rows share the id.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.sources_path = self.directory / "sources.json"
+
+    def sources(self):
+        """ Returns the watermarks of the sources, ``None`` when an update
+            of the state did not finish.
+        """
+        if not self.sources_path.exists():
+            return {}
+        with open(str(self.sources_path)) as f:
+            sources = json.load(f)
+        return sources if sources.pop("complete", False) else None
+
+    def write_sources(self, sources, complete):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(str(self.sources_path), "w") as f:
+            json.dump(dict(sources, complete=complete), f, indent=2, sort_keys=True)
+
+    def reset(self):
+        if self.directory.exists():
+            shutil.rmtree(str(self.directory))
+
+    def read(self, name, columns, index=None):
+        path = self.directory / (name + ".parquet")
+        data = read_table(path) if path.exists() else pd.DataFrame(columns=columns)
+        return data if index is None else data.set_index(index)
+
+    def write(self, name, data):
+        write_table(data, self.directory / (name + ".parquet"))
+
+
+def _sources_to_read(input_path, state, results_filepath, force):
+    """ Returns the offsets from which the sources are read, all zeros
+        when the state has to be built again.
+
+    Everything is read again when a byte before the watermark of a source
+    changed, which is found by hashing the part of the source that was
+    already read. Hashing it costs a fraction of parsing and checking
+    it. The state is also built again when the checks it was kept for
+    are gone.
+    """
+    sources = None if force or not results_filepath.exists() else state.sources()
+    offsets = {}
+    for name, filename in SOURCES.items():
+        known = (sources or {}).get(name)
+        filepath = input_path / filename
+        if (
+            known is None
+            or filepath.stat().st_size < known["offset"]
+            or _prefix_digest(filepath, known["offset"]) != known["digest"]
+        ):
+            logger.info("%s changed, checking every day again", filepath)
+            state.reset()
+            return {name: 0 for name in SOURCES}
+        offsets[name] = known["offset"]
+    return offsets
+
+
+def _summarize(orders, items):
+    """ Returns the sums of :class:`QualityState` ``order_ids`` of the new
+        ``orders`` and ``items``.
+    """
+    totals = item_totals(items)
+    summary = pd.concat(
+        [
+            orders.id_order.value_counts().rename("n_orders"),
+            items.id_order.value_counts().rename("n_items"),
+            totals.total_items_price,
+            totals.unpriced_items,
+        ],
+        axis=1,
+    )
+    return summary.reindex(columns=SUMMARY_COLUMNS).fillna(0)
+
+
+def _lookup(values, keys):
+    return values.reindex(keys).fillna(0).to_numpy()
+
+
+def partition_checks(orders, items):
+    """ Runs the checks of every day of ``orders`` and ``items``, whose rows
+        carry the facts from other days that the checks need.
+    """
+    completed = orders.state.astype(str).to_numpy() == "Completed"
+    checks_orders = pd.DataFrame(
+        {
+            "day": orders.day,
+            "n_orders": 1,
+            "null_total_paid": orders.total_paid.isna(),
+            "zero_total_paid": orders.total_paid == 0,
+            "duplicate_order_ids": orders.duplicate,
+            "orders_without_items": ~orders.has_items,
+            "completed_orders": completed,
+            "matching_completed_orders": completed & orders.price_matches,
+        }
+    )
+    checks_items = pd.DataFrame(
+        {
+            "day": items.day,
+            "n_items": 1,
+            "orphan_items": ~items.has_order,
+            "null_unit_price": items.unit_price.isna(),
+            "negative_unit_price": items.unit_price < 0,
+            "duplicate_item_ids": items.duplicate,
+        }
+    )
+    data = (
+        checks_orders.groupby("day")
+        .sum()
+        .join(checks_items.groupby("day").sum(), how="outer")
+    )
+    return data.reindex(columns=CHECK_COLUMNS).fillna(0).astype(np.int64)
+
+
+def run_checks(input_path, state_path, results_filepath, force=False):
+    """ Updates the checks stored in ``results_filepath`` with the rows
+        appended to the sources in ``input_path`` and returns them, one
+        row per day of ``created_date``.
+
+    The sources are read from where the previous run stopped, and only
+    the days of the new rows and the days that share an order or item id
+    with them are checked again, from the rows of those days and the
+    sums over all days kept in the :class:`QualityState` in
+    ``state_path``. When a source changed before that point, instead of
+    only growing, or ``results_filepath`` is gone, every day is checked
+    again.
+    """
+    input_path = Path(input_path)
+    results_filepath = Path(results_filepath)
+    state = QualityState(state_path)
+    offsets = _sources_to_read(input_path, state, results_filepath, force)
+    new_orders, orders_end = read_appended(
+        input_path / SOURCES["orders"], offsets["orders"], read_orders
+    )
+    new_items, items_end = read_appended(
+        input_path / SOURCES["items"], offsets["items"], read_lineitems
+    )
+    if results_filepath.exists() and not len(new_orders) and not len(new_items):
+        logger.info("no new orders or items")
+        return read_table(results_filepath)
+    state.write_sources({}, complete=False)
+
+    new_orders["day"] = _day_keys(new_orders.created_date)
+    new_items["day"] = _day_keys(new_items.date)
+    order_ids = (
+        pd.concat(
+            [
+                state.read("order_ids", ["id_order"] + SUMMARY_COLUMNS, "id_order"),
+                _summarize(new_orders, new_items),
+            ]
+        )
+        .groupby(level=0)
+        .sum()
+        .astype({"n_orders": np.int64, "n_items": np.int64, "unpriced_items": np.int64})
+    )
+    item_ids = (
+        pd.concat(
+            [
+                state.read("item_ids", ["id", "n_items"], "id").n_items,
+                new_items.id.value_counts(),
+            ]
+        )
+        .groupby(level=0)
+        .sum()
+        .astype(np.int64)
+        .rename("n_items")
+    )
+
+    # the days whose rows share an id with the new rows
+    touched = np.union1d(new_orders.id_order, new_items.id_order)
+    order_days = (
+        pd.concat(
+            [
+                state.read("order_days", ["id_order", "day"]),
+                new_orders[["id_order", "day"]],
+                new_items[["id_order", "day"]],
+            ]
+        )
+        .drop_duplicates()
+        .astype(np.int64)
+    )
+    item_days = (
+        pd.concat([state.read("item_days", ["id", "day"]), new_items[["id", "day"]]])
+        .drop_duplicates()
+        .astype(np.int64)
+    )
+    days = np.union1d(
+        order_days.day[order_days.id_order.isin(touched)].to_numpy(np.int64),
+        item_days.day[item_days.id.isin(new_items.id)].to_numpy(np.int64),
+    )
+
+    for name, new, columns in (
+        ("orders", new_orders, ORDER_COLUMNS),
+        ("items", new_items, ITEM_COLUMNS),
+    ):
+        new_days = np.unique(new.day.to_numpy(np.int64))
+        old = read_partitions(state.directory / name, "day", new_days, columns)
+        write_partitions(
+            pd.concat([old, new[columns]], ignore_index=True),
+            state.directory / name,
+            "day",
+        )
+    state.write("order_ids", order_ids.reset_index())
+    state.write("item_ids", item_ids.reset_index())
+    state.write("order_days", order_days.reset_index(drop=True))
+    state.write("item_days", item_days.reset_index(drop=True))
+
+    logger.info("checking %d days", len(days))
+    orders = read_partitions(state.directory / "orders", "day", days, ORDER_COLUMNS)
+    items = read_partitions(state.directory / "items", "day", days, ITEM_COLUMNS)
+    priced = order_ids[order_ids.n_items > 0]
+    orders = match_prices(orders, priced).assign(day=orders.day.to_numpy())
+    orders["duplicate"] = _lookup(order_ids.n_orders, orders.id_order) > 1
+    orders["has_items"] = _lookup(order_ids.n_items, orders.id_order) > 0
+    items["has_order"] = _lookup(order_ids.n_orders, items.id_order) > 0
+    items["duplicate"] = _lookup(item_ids, items.id) > 1
+    checks = partition_checks(orders, items).reindex(days, fill_value=0)
+
+    # the checks of the other days still hold unless everything is read
+    if results_filepath.exists() and any(offsets.values()):
+        previous = read_table(results_filepath)
+        previous.index = pd.Index(_day_keys(previous.day), name="day")
+        checks = pd.concat(
+            [previous.loc[~previous.index.isin(days), CHECK_COLUMNS], checks]
+        )
+    results = checks.astype(np.int64).sort_index()
+    results.index = pd.Index(
+        results.index.to_numpy(np.int64).view("datetime64[ns]"), name="day"
+    )
+    results = results.reset_index()
+    results["percent_matching"] = (
+        results.matching_completed_orders * 100 / results.completed_orders
+    )
+    results_filepath.parent.mkdir(parents=True, exist_ok=True)
+    write_table(results, results_filepath)
+
+    state.write_sources(
+        {
+            name: {"offset": end, "digest": _prefix_digest(input_path / filename, end)}
+            for (name, filename), end in zip(SOURCES.items(), (orders_end, items_end))
+        },
+        complete=True,
+    )
+    return results
+
+
+@click.command()
+@click.argument("input_filepath", type=click.Path(exists=True))
+@click.argument("output_filepath", type=click.Path())
+@click.option("--force", is_flag=True, help="Check every day again.")
+def main(input_filepath, output_filepath, force):
+    """ Runs the data quality checks of the orders and items appended to
+        INPUT_FILEPATH (../raw) since the last run and saves the checks
+        of every day to OUTPUT_FILEPATH (../processed).
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("checking the quality of the orders and items")
+
+    results = run_checks(
+        input_filepath,
+        Path(output_filepath) / "quality_state",
+        Path(output_filepath) / "quality_checks.parquet",
+        force,
+    )
+    totals = results[CHECK_COLUMNS].sum()
+    for check in CHECK_COLUMNS:
+        logger.info("%s: %d", check, totals[check])
+    logger.info(
+        "completed orders with matching prices: %.1f %%",
+        totals.matching_completed_orders * 100 / max(totals.completed_orders, 1),
+    )
+
+
+if __name__ == "__main__":
+    log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,78 @@
+"""
+.. module:: tables.py
+    :synopsis: Typed loaders for the raw orders and line items.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+ORDERS_DTYPES = {"id_order": "int32", "total_paid": "float64", "state": "category"}
+
+LINEITEMS_DTYPES = {
+    "id": "int32",
+    "id_order": "int32",
+    "product_id": "int32",
+    "product_quantity": "int32",
+    "sku": "category",
+    "unit_price": "float64",
+}
+
+
+def _strip_categories(values):
+    """ Strips whitespace around the categories of ``values``, merging the
+        categories that only differ by it, without touching every row.
+        Missing values stay missing, also when every value is missing.
+    """
+    stripped = values.cat.categories.astype(str).str.strip()
+    remap, categories = pd.factorize(stripped)
+    codes = values.cat.codes.to_numpy().astype(np.int64)
+    known = codes >= 0
+    codes[known] = remap[codes[known]]
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def read_orders(filepath, engine="c"):
+    """ Reads ``orders_translated.csv`` with ``created_date`` parsed while
+        reading, ``state`` as a categorical and ``id_order`` as 32 bit
+        integers.
+
+    ``engine`` is passed to :func:`pandas.read_csv`, ``"pyarrow"`` reads
+    in parallel with pandas 1.4 and newer.
+    """
+    return pd.read_csv(
+        filepath,
+        sep=";",
+        decimal=",",
+        dtype=ORDERS_DTYPES,
+        parse_dates=["created_date"],
+        engine=engine,
+    )
+
+
+def read_lineitems(filepath, engine="c"):
+    """ Reads ``lineitems.csv`` with ``date`` parsed while reading, the
+        skus stripped of whitespace as a categorical, the ids as 32 bit
+        integers and the quantities as the smallest integers that hold
+        them.
+
+    ``engine`` is passed to :func:`pandas.read_csv` like in
+    :func:`read_orders`.
+    """
+    data_items = pd.read_csv(
+        filepath,
+        sep=";",
+        decimal=",",
+        dtype=LINEITEMS_DTYPES,
+        parse_dates=["date"],
+        engine=engine,
+    )
+    data_items["sku"] = _strip_categories(data_items.sku)
+    data_items["product_quantity"] = pd.to_numeric(
+        data_items.product_quantity, downcast="integer"
+    )
+    return data_items
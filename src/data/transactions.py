@@ -0,0 +1,254 @@
+"""
+.. module:: transactions.py
+    :synopsis: Basket data stored as a sparse matrix of interned item ids.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+
+class Transactions:
+    """ Baskets stored as a CSR matrix of integer item ids.
+
+    The items of transaction ``t`` are
+    ``indices[indptr[t]:indptr[t + 1]]`` and ``labels[i]`` is the sku
+    behind item id ``i``. Item ids are unique within a transaction.
+    """
+
+    def __init__(self, indptr, indices, labels):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.labels = np.asarray(labels, dtype=object)
+
+    def __len__(self):
+        return self.n_transactions
+
+    def __repr__(self):
+        return "<Transactions: {} transactions, {} items>".format(
+            self.n_transactions, self.n_items
+        )
+
+    @property
+    def n_transactions(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_items(self):
+        return len(self.labels)
+
+    def basket(self, t):
+        """ Returns the skus of transaction ``t`` as a list.
+        """
+        return list(self.labels[self.indices[self.indptr[t] : self.indptr[t + 1]]])
+
+    def basket_sizes(self):
+        """ Returns the number of unique items in each transaction.
+        """
+        return np.diff(self.indptr)
+
+    def row_ids(self):
+        """ Returns the transaction id of every entry in ``indices``.
+        """
+        return np.repeat(
+            np.arange(self.n_transactions, dtype=np.int64), self.basket_sizes()
+        )
+
+    def take(self, rows):
+        """ Returns the transactions ``rows`` in the given order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        sizes = self.basket_sizes()[rows]
+        indptr = np.r_[0, np.cumsum(sizes)]
+        offsets = np.arange(indptr[-1], dtype=np.int64) - np.repeat(indptr[:-1], sizes)
+        positions = np.repeat(self.indptr[rows], sizes) + offsets
+        return Transactions(indptr, self.indices[positions], self.labels)
+
+    def item_counts(self):
+        """ Returns the number of transactions that contain each item.
+        """
+        return np.bincount(self.indices, minlength=self.n_items).astype(np.int64)
+
+
+def _labels(vocabulary):
+    """ Returns the skus of ``vocabulary`` ordered by item id.
+    """
+    labels = np.empty(len(vocabulary), dtype=object)
+    labels[:] = list(vocabulary)
+    return labels
+
+
+def _parse_chunk(lines, sep, vocabulary):
+    """ Parses basket lines into ``(basket_sizes, indices)`` arrays,
+        interning new skus into ``vocabulary``. Blank lines are skipped
+        like :func:`pandas.read_csv` skips them.
+    """
+    lines = [line for line in (line.strip() for line in lines) if line]
+    if not lines:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    sizes = np.array([line.count(sep) + 1 for line in lines])
+    tokens = sep.join(lines).split(sep)
+
+    # skus are interned once per chunk instead of once per line item
+    codes, uniques = pd.factorize(np.asarray(tokens, dtype=object))
+    ids = np.array(
+        [vocabulary.setdefault(sku, len(vocabulary)) if sku else -1 for sku in uniques],
+        dtype=np.int64,
+    )
+    ids = ids[codes]
+    rows = np.repeat(np.arange(len(lines), dtype=np.int64), sizes)
+
+    # dropping empty fields and items repeated within a basket
+    keys = np.unique(rows[ids >= 0] * (len(vocabulary) + 1) + ids[ids >= 0])
+    rows = keys // (len(vocabulary) + 1)
+    sizes = np.bincount(rows, minlength=len(lines))
+    return sizes, (keys % (len(vocabulary) + 1)).astype(np.int32)
+
+
+def iter_transactions(
+    filepath, chunksize=100000, sep=",", header=True, vocabulary=None
+):
+    """ Streams a basket file in chunks of ``chunksize`` transactions.
+
+    Every chunk is a :class:`Transactions` of its own, but the item ids
+    come from the shared ``vocabulary`` dict (sku -> item id) so they
+    agree across chunks. Memory is bounded by the size of one chunk and
+    the vocabulary.
+    """
+    if vocabulary is None:
+        vocabulary = {}
+    with open(filepath, "r") as f:
+        if header:
+            next(f, None)
+        while True:
+            lines = list(islice(f, chunksize))
+            if not lines:
+                break
+            sizes, indices = _parse_chunk(lines, sep, vocabulary)
+            if not len(sizes):
+                continue
+            indptr = np.r_[0, np.cumsum(sizes)]
+            yield Transactions(indptr, indices, _labels(vocabulary))
+
+
+def read_transactions(filepath, chunksize=100000, sep=",", header=True):
+    """ Reads a basket file such as ``trans.csv`` where every line holds
+        the skus of one transaction separated by ``sep``.
+
+    The file is parsed in chunks straight into a CSR matrix, so memory
+    grows with the number of line items rather than with the number of
+    baskets times the size of the largest basket.
+    """
+    vocabulary = {}
+    sizes = []
+    indices = []
+    with open(filepath, "r") as f:
+        if header:
+            next(f, None)
+        while True:
+            lines = list(islice(f, chunksize))
+            if not lines:
+                break
+            chunk_sizes, chunk_indices = _parse_chunk(lines, sep, vocabulary)
+            sizes.append(chunk_sizes)
+            indices.append(chunk_indices)
+
+    sizes = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+    return Transactions(np.r_[0, np.cumsum(sizes)], indices, _labels(vocabulary))
+
+
+def transactions_from_baskets(baskets):
+    """ Builds transactions from an iterable of sku lists, such as the
+        ``items`` column of ``trans_enriched``.
+    """
+    vocabulary = {}
+    sizes = []
+    indices = []
+    for basket in baskets:
+        ids = {vocabulary.setdefault(sku, len(vocabulary)) for sku in basket}
+        sizes.append(len(ids))
+        indices.extend(sorted(ids))
+    return Transactions(
+        np.r_[0, np.cumsum(sizes, dtype=np.int64)],
+        np.array(indices, dtype=np.int32),
+        _labels(vocabulary),
+    )
+
+
+def _order_baskets(order_ids, codes, min_products):
+    """ Groups line items into baskets with one sort by order id.
+
+    Returns the order id, the number of unique items and the item ids of
+    every order with at least ``min_products`` line items.
+    """
+    if not len(order_ids):
+        return order_ids[:0], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    order = np.lexsort((codes, order_ids))
+    order_ids = order_ids[order]
+    codes = codes[order]
+
+    new_order = np.r_[True, order_ids[1:] != order_ids[:-1]]
+    starts = np.flatnonzero(new_order)
+    lines = np.diff(np.r_[starts, len(order_ids)])
+    group = np.cumsum(new_order) - 1
+
+    # trans.csv counts line items, so an order with the same sku on two
+    # lines is a basket even though it holds only one unique item
+    kept_orders = lines >= min_products
+    first_of_sku = new_order | np.r_[True, codes[1:] != codes[:-1]]
+    kept = kept_orders[group] & first_of_sku
+
+    sizes = np.bincount(group[kept], minlength=len(starts))[kept_orders]
+    return order_ids[starts][kept_orders], sizes, codes[kept].astype(np.int32)
+
+
+def baskets_from_lineitems(data_items, min_products=2, n_jobs=1):
+    """ Rebuilds the transactions from line items keyed by ``id_order``.
+
+    Baskets are formed by sorting the line items on their order id, so
+    they do not depend on the row order of any file. Returns the order id
+    of every transaction and the transactions. With ``n_jobs`` above one
+    the orders are split into order id ranges that are grouped in
+    parallel processes.
+    """
+    order_ids = data_items["id_order"].to_numpy()
+    if isinstance(data_items["sku"].dtype, pd.CategoricalDtype):
+        codes = data_items["sku"].cat.codes.to_numpy().astype(np.int64)
+        labels = np.asarray(data_items["sku"].cat.categories, dtype=object)
+    else:
+        codes, labels = pd.factorize(data_items["sku"])
+        labels = np.asarray(labels, dtype=object)
+    has_sku = codes >= 0
+    order_ids = order_ids[has_sku]
+    codes = codes[has_sku]
+
+    if n_jobs == 1 or not len(order_ids):
+        parts = [_order_baskets(order_ids, codes, min_products)]
+    else:
+        unique_ids = np.unique(order_ids)
+        bounds = unique_ids[
+            np.linspace(0, len(unique_ids), n_jobs + 1)[1:-1].astype(np.int64)
+        ]
+        # every range of order ids holds whole orders, so the ranges are
+        # independent and their baskets only need to be concatenated
+        part = np.searchsorted(bounds, order_ids, side="right")
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(
+                    _order_baskets,
+                    order_ids[part == k],
+                    codes[part == k],
+                    min_products,
+                )
+                for k in range(n_jobs)
+            ]
+            parts = [future.result() for future in futures]
+
+    ids = np.concatenate([ids for ids, _, _ in parts])
+    sizes = np.concatenate([sizes for _, sizes, _ in parts])
+    indices = np.concatenate([indices for _, _, indices in parts])
+    return ids, Transactions(np.r_[0, np.cumsum(sizes)], indices, labels)
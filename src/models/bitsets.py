@@ -0,0 +1,104 @@
+"""
+.. module:: bitsets.py
+    :synopsis: Vertical tid-lists stored as uint64 bitsets.
+
+"""
+
+import numpy as np
+
+# number of set bits in every possible byte
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# candidates counted at once when support counting arbitrary itemsets
+_COUNT_BLOCK_SIZE = 4096
+
+
+def popcount(words):
+    """ Counts the set bits of uint64 bitsets along the last axis.
+    """
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    as_bytes = words.view(np.uint8).reshape(words.shape[:-1] + (-1,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+def vertical_bitsets(transactions, items=None):
+    """ Returns the tid-lists of ``items`` (all items by default) as a
+        ``(len(items), ceil(n_transactions / 64))`` array of uint64 bitsets.
+        Bit ``t`` of row ``k`` is set when transaction ``t`` contains
+        ``items[k]``.
+    """
+    n_words = (transactions.n_transactions + 63) // 64
+    rows = transactions.row_ids()
+    columns = transactions.indices.astype(np.int64)
+
+    if items is None:
+        n_rows = transactions.n_items
+    else:
+        items = np.asarray(items, dtype=np.int64)
+        n_rows = len(items)
+        position = np.full(transactions.n_items, -1, dtype=np.int64)
+        position[items] = np.arange(n_rows)
+        columns = position[columns]
+        selected = columns >= 0
+        rows = rows[selected]
+        columns = columns[selected]
+
+    # or together the bits of every (item, word) pair in one sorted pass
+    keys = columns * n_words + (rows >> 6)
+    bits = np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64))
+    order = np.argsort(keys, kind="mergesort")
+    keys = keys[order]
+    bits = bits[order]
+
+    bitsets = np.zeros(n_rows * n_words, dtype=np.uint64)
+    if len(keys):
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        bitsets[keys[starts]] = np.bitwise_or.reduceat(bits, starts)
+    return bitsets.reshape(n_rows, n_words)
+
+
+def count_candidates(transactions, candidates, bitsets=None):
+    """ Counts the transactions that contain each row of the
+        ``(n_candidates, length)`` item id array ``candidates``.
+
+    ``bitsets`` can be passed to reuse tid-lists that were already built
+    with :func:`vertical_bitsets` for all items.
+    """
+    candidates = np.asarray(candidates, dtype=np.int64)
+    counts = np.zeros(len(candidates), dtype=np.int64)
+    if candidates.ndim != 2 or not len(candidates):
+        return counts
+    if candidates.shape[1] == 0:
+        counts[:] = transactions.n_transactions
+        return counts
+
+    if bitsets is None:
+        items, rows = np.unique(candidates, return_inverse=True)
+        rows = rows.reshape(candidates.shape)
+        bitsets = vertical_bitsets(transactions, items)
+    else:
+        rows = candidates
+
+    # candidates are intersected block by block to bound the memory used
+    for start in range(0, len(rows), _COUNT_BLOCK_SIZE):
+        block = rows[start : start + _COUNT_BLOCK_SIZE]
+        joint = bitsets[block[:, 0]]
+        for k in range(1, block.shape[1]):
+            joint = joint & bitsets[block[:, k]]
+        counts[start : start + len(block)] = popcount(joint)
+    return counts
+
+
+def count_itemsets(transactions, itemsets, bitsets=None):
+    """ Counts the transactions that contain each of ``itemsets``, which
+        may be of different lengths.
+    """
+    itemsets = [tuple(itemset) for itemset in itemsets]
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    lengths = np.array([len(itemset) for itemset in itemsets], dtype=np.int64)
+    for length in np.unique(lengths):
+        selected = np.flatnonzero(lengths == length)
+        candidates = np.array([itemsets[i] for i in selected], dtype=np.int64)
+        candidates = candidates.reshape(len(selected), length)
+        counts[selected] = count_candidates(transactions, candidates, bitsets)
+    return counts
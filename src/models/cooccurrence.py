@@ -0,0 +1,78 @@
+"""
+.. module:: cooccurrence.py
+    :synopsis: Item by item co-occurrence counts of the basket matrix.
+
+"""
+
+import numpy as np
+from scipy import sparse
+
+# categories and other levels with at most this many items are counted
+# with a dense matrix product
+DENSE_MAX_ITEMS = 512
+
+
+def basket_matrix(transactions, dtype=np.int32):
+    """ Returns the transactions as a sparse 0/1 matrix of shape
+        ``(n_transactions, n_items)``.
+    """
+    return sparse.csr_matrix(
+        (
+            np.ones(len(transactions.indices), dtype=dtype),
+            transactions.indices,
+            transactions.indptr,
+        ),
+        shape=(transactions.n_transactions, transactions.n_items),
+    )
+
+
+def cooccurrence(transactions, block_size=2048, dtype=np.int32, dense=None):
+    """ Returns the number of transactions that contain every pair of
+        items, ``X.T @ X`` of the basket matrix ``X``, with the item counts
+        on the diagonal.
+
+    The product is computed for ``block_size`` items at a time, so only
+    one block of rows of the result is built at once. ``dtype`` is
+    ``np.int32`` or ``np.float32`` for results that feed floating point
+    measures. The result is a sparse CSR matrix, or a dense array when
+    ``dense`` is true or, by default, when there are at most
+    ``DENSE_MAX_ITEMS`` items such as on the category level.
+    """
+    if dense is None:
+        dense = transactions.n_items <= DENSE_MAX_ITEMS
+    matrix = basket_matrix(transactions, dtype)
+    if dense:
+        # only the product is dense, the baskets stay sparse
+        return (matrix.T @ matrix).toarray().astype(dtype, copy=False)
+
+    columns = matrix.tocsc()
+    blocks = [
+        (columns[:, start : start + block_size].T @ matrix).tocsr()
+        for start in range(0, transactions.n_items, block_size)
+    ]
+    if not blocks:
+        return sparse.csr_matrix((0, 0), dtype=dtype)
+    return sparse.vstack(blocks, format="csr").astype(dtype, copy=False)
+
+
+def pair_counts(transactions, min_count=1, **options):
+    """ Returns the ``(first, second, count)`` arrays of the ordered item
+        pairs contained in at least ``min_count`` transactions, along
+        with the item counts, from one :func:`cooccurrence` pass.
+    """
+    matrix = cooccurrence(transactions, **options)
+    if isinstance(matrix, np.ndarray):
+        item_counts = np.diag(matrix).astype(np.int64)
+        first, second = np.nonzero(matrix)
+        counts = matrix[first, second]
+    else:
+        item_counts = matrix.diagonal().astype(np.int64)
+        matrix = matrix.tocoo()
+        first, second, counts = matrix.row, matrix.col, matrix.data
+    keep = (first != second) & (counts >= min_count)
+    return (
+        first[keep].astype(np.int64),
+        second[keep].astype(np.int64),
+        counts[keep].astype(np.int64),
+        item_counts,
+    )
@@ -0,0 +1,76 @@
+"""
+.. module:: coverage.py
+    :synopsis: Transactions covered by association rules.
+
+"""
+
+import numpy as np
+
+from src.models.bitsets import popcount, vertical_bitsets
+
+# rules intersected at once when building their tid-lists
+_BLOCK_SIZE = 4096
+
+
+def _rule_items(rules):
+    """ Returns the items of every rule, antecedent and consequent together,
+        as a rectangular array. Shorter rules are padded by repeating their
+        consequent, which does not change their intersection.
+    """
+    itemsets = [
+        rules.itemsets[a] + rules.itemsets[c]
+        for a, c in zip(rules.antecedent.tolist(), rules.consequent.tolist())
+    ]
+    width = max((len(itemset) for itemset in itemsets), default=1)
+    return np.array(
+        [itemset + itemset[-1:] * (width - len(itemset)) for itemset in itemsets],
+        dtype=np.int64,
+    ).reshape(len(itemsets), width)
+
+
+def _supporting_blocks(rules, transactions):
+    """ Yields the tid-lists of the transactions that support each rule,
+        like ``arules::supportingTransactions``, in blocks of rules.
+    """
+    items = _rule_items(rules)
+    used, rows = np.unique(items, return_inverse=True)
+    rows = rows.reshape(items.shape)
+    bitsets = vertical_bitsets(transactions, used)
+    for start in range(0, len(rows), _BLOCK_SIZE):
+        block = rows[start : start + _BLOCK_SIZE]
+        joint = bitsets[block[:, 0]]
+        for k in range(1, block.shape[1]):
+            joint = joint & bitsets[block[:, k]]
+        yield joint
+
+
+def combined_coverage(rules, transactions):
+    """ Returns the share of ``transactions`` that support at least one of
+        ``rules``.
+
+    The tid-list bitsets of the rules are ored together and popcounted,
+    so supporting transaction ids are never listed.
+    """
+    covered = np.zeros((transactions.n_transactions + 63) // 64, dtype=np.uint64)
+    for joint in _supporting_blocks(rules, transactions):
+        covered |= np.bitwise_or.reduce(joint, axis=0)
+    return int(popcount(covered)) / transactions.n_transactions
+
+
+def incremental_coverage(rules, transactions, by=None):
+    """ Returns the share of ``transactions`` covered by the first one, two,
+        three and so on rules, taking the rules in descending order of the
+        quality measure ``by`` or in their table order.
+    """
+    if by is not None:
+        rules = rules[np.argsort(-getattr(rules, by), kind="mergesort")]
+
+    coverage = np.zeros(len(rules), dtype=np.int64)
+    covered = np.zeros((transactions.n_transactions + 63) // 64, dtype=np.uint64)
+    start = 0
+    for joint in _supporting_blocks(rules, transactions):
+        cumulative = np.bitwise_or.accumulate(joint, axis=0) | covered
+        coverage[start : start + len(joint)] = popcount(cumulative)
+        covered = cumulative[-1]
+        start += len(joint)
+    return coverage / transactions.n_transactions
@@ -0,0 +1,197 @@
+"""
+.. module:: fpgrowth.py
+    :synopsis: FP-Growth over an FP-tree stored in flat parallel arrays.
+
+"""
+
+from array import array
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+
+
+class FPTree:
+    """ FP-tree stored as parallel int32 arrays instead of node objects.
+
+    Node ``k`` holds ``item[k]`` with ``count[k]`` under ``parent[k]`` and
+    ``link[k]`` points to the previous node of the same item, so following
+    ``link`` from ``head[item]`` visits every node of an item. Node 0 is
+    the root. A node costs 16 bytes whatever the size of the tree.
+    """
+
+    def __init__(self):
+        self.parent = array("i", [-1])
+        self.item = array("i", [-1])
+        self.count = array("i", [0])
+        self.link = array("i", [-1])
+        self.head = {}
+        self.item_counts = {}
+
+    def __len__(self):
+        return len(self.parent) - 1
+
+    @classmethod
+    def from_paths(cls, paths, counts):
+        """ Builds a tree from item paths that are already in tree order.
+
+        The paths are inserted in lexicographic order, so the nodes a path
+        shares with the tree are always on the previously inserted path
+        and no child lookup table is needed.
+        """
+        tree = cls()
+        parent, item, count, link = tree.parent, tree.item, tree.count, tree.link
+        head, item_counts = tree.head, tree.item_counts
+
+        stack = [0]
+        previous = ()
+        for k in sorted(range(len(paths)), key=paths.__getitem__):
+            path = paths[k]
+            path_count = counts[k]
+
+            shared = 0
+            limit = min(len(path), len(previous))
+            while shared < limit and path[shared] == previous[shared]:
+                shared += 1
+            del stack[shared + 1 :]
+
+            for node in stack[1:]:
+                count[node] += path_count
+            for path_item in path[shared:]:
+                node = len(parent)
+                parent.append(stack[-1])
+                item.append(path_item)
+                count.append(path_count)
+                link.append(head.get(path_item, -1))
+                head[path_item] = node
+                stack.append(node)
+            for path_item in path:
+                item_counts[path_item] = item_counts.get(path_item, 0) + path_count
+            previous = path
+        return tree
+
+    def is_single_path(self):
+        """ Tells if every node of the tree has at most one child.
+        """
+        return all(self.parent[node] == node - 1 for node in range(1, len(self.parent)))
+
+    def prefix_paths(self, path_item):
+        """ Returns the conditional pattern base of ``path_item``: the path
+            above each of its nodes together with the count of the node.
+        """
+        parent, item = self.parent, self.item
+        paths = []
+        counts = []
+        node = self.head.get(path_item, -1)
+        while node != -1:
+            path = []
+            ancestor = parent[node]
+            while ancestor > 0:
+                path.append(item[ancestor])
+                ancestor = parent[ancestor]
+            if path:
+                path.reverse()
+                paths.append(tuple(path))
+                counts.append(self.count[node])
+            node = self.link[node]
+        return paths, counts
+
+
+def _conditional_tree(paths, counts, min_count):
+    """ Builds the FP-tree of a conditional pattern base keeping only the
+        items that are frequent within it.
+    """
+    local_counts = Counter()
+    for path, path_count in zip(paths, counts):
+        for path_item in path:
+            local_counts[path_item] += path_count
+    frequent = {i for i, c in local_counts.items() if c >= min_count}
+    if not frequent:
+        return None
+
+    kept_paths = []
+    kept_counts = []
+    for path, path_count in zip(paths, counts):
+        path = tuple(i for i in path if i in frequent)
+        if path:
+            kept_paths.append(path)
+            kept_counts.append(path_count)
+    return FPTree.from_paths(kept_paths, kept_counts)
+
+
+def _grow(tree, suffix, min_count, max_len, found):
+    """ Adds every frequent itemset of ``tree`` extended by ``suffix`` to
+        ``found``.
+    """
+    # items are frequency ranks, so the least frequent items come first
+    for path_item in sorted(tree.item_counts, reverse=True):
+        support = tree.item_counts[path_item]
+        if support < min_count:
+            continue
+        itemset = suffix + (path_item,)
+        found[itemset] = support
+        if max_len is not None and len(itemset) >= max_len:
+            continue
+
+        conditional = _conditional_tree(*tree.prefix_paths(path_item), min_count)
+        if conditional is None:
+            continue
+        if conditional.is_single_path():
+            _enumerate_path(conditional, itemset, max_len, found)
+        else:
+            _grow(conditional, itemset, min_count, max_len, found)
+
+
+def _enumerate_path(tree, suffix, max_len, found):
+    """ Adds every combination of the items on a single path tree. The
+        support of a combination is the count of its deepest node.
+    """
+    items = tree.item[1:]
+    counts = tree.count[1:]
+    longest = len(items)
+    if max_len is not None:
+        longest = min(longest, max_len - len(suffix))
+    for length in range(1, longest + 1):
+        for chosen in combinations(range(len(items)), length):
+            itemset = suffix + tuple(items[k] for k in chosen)
+            found[itemset] = counts[chosen[-1]]
+
+
+def fpgrowth(transactions, min_count, max_len=None):
+    """ Mines all itemsets contained in at least ``min_count`` transactions
+        with FP-Growth.
+    """
+    item_counts = transactions.item_counts()
+    frequent = np.flatnonzero(item_counts >= min_count)
+    # rank 0 is the most frequent item and sits closest to the root
+    frequent = frequent[np.argsort(-item_counts[frequent], kind="mergesort")]
+    rank = np.full(transactions.n_items, -1, dtype=np.int64)
+    rank[frequent] = np.arange(len(frequent))
+
+    ranks = rank[transactions.indices]
+    rows = transactions.row_ids()
+    kept = ranks >= 0
+    ranks = ranks[kept]
+    rows = rows[kept]
+    order = np.lexsort((ranks, rows))
+    ranks = ranks[order].astype(np.int32)
+    sizes = np.bincount(rows, minlength=len(transactions))
+
+    # identical baskets are inserted once with their multiplicity; baskets
+    # of the same size form a 2d array that np.unique deduplicates, so
+    # only the distinct baskets become Python tuples
+    paths = []
+    counts = []
+    for size in np.unique(sizes[sizes > 0]):
+        baskets = ranks[np.repeat(sizes == size, sizes)].reshape(-1, size)
+        baskets, multiplicity = np.unique(baskets, axis=0, return_counts=True)
+        paths.extend(map(tuple, baskets.tolist()))
+        counts.extend(multiplicity.tolist())
+    tree = FPTree.from_paths(paths, counts)
+
+    found = {}
+    _grow(tree, (), min_count, max_len, found)
+    return {
+        tuple(sorted(int(frequent[r]) for r in itemset)): int(support)
+        for itemset, support in found.items()
+    }
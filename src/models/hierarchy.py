@@ -0,0 +1,133 @@
+"""
+.. module:: hierarchy.py
+    :synopsis: Sku, brand and category levels of items as lookup arrays.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.data.transactions import Transactions
+from src.models.itemsets import frequent_itemsets
+
+
+def _remap(transactions, codes, labels):
+    """ Returns ``transactions`` with every item id ``i`` replaced by
+        ``codes[i]``, keeping each code once per transaction.
+    """
+    n_codes = len(labels)
+    rows = transactions.row_ids()
+    keys = np.unique(rows * n_codes + codes[transactions.indices])
+    sizes = np.bincount(keys // n_codes, minlength=transactions.n_transactions)
+    return Transactions(np.r_[0, np.cumsum(sizes)], keys % n_codes, labels)
+
+
+class ItemHierarchy:
+    """ Maps the item ids of transactions to coarser levels such as brands
+        and product categories.
+
+    ``levels`` maps a level name to an integer array that holds the code
+    of every item id on that level and ``labels`` maps the level name to
+    the labels of those codes. The sku level is the item ids themselves.
+    """
+
+    def __init__(self, item_labels, levels, labels):
+        self.item_labels = np.asarray(item_labels, dtype=object)
+        self.levels = {"sku": np.arange(len(self.item_labels), dtype=np.int64)}
+        self.levels.update(
+            {name: np.asarray(codes, dtype=np.int64) for name, codes in levels.items()}
+        )
+        self.labels = {"sku": self.item_labels}
+        self.labels.update(
+            {name: np.asarray(values, dtype=object) for name, values in labels.items()}
+        )
+
+    def __repr__(self):
+        return "<ItemHierarchy: {}>".format(
+            ", ".join(
+                "{} {}".format(len(self.labels[name]), name) for name in self.levels
+            )
+        )
+
+    @classmethod
+    def from_categories(
+        cls, item_labels, data_categories, brand_length=3, unknown="unknown"
+    ):
+        """ Builds the brand and category levels of the skus ``item_labels``.
+
+        The brand is the first ``brand_length`` characters of the sku and
+        the category comes from ``data_categories`` with the columns
+        ``labels`` and ``level1``, as read from the product category pdf.
+        Skus without a category, and missing skus also without a brand,
+        get ``unknown``.
+        """
+        skus = pd.Series(np.asarray(item_labels, dtype=object))
+        brand_codes, brands = pd.factorize(skus.str[:brand_length].fillna(unknown))
+
+        categories = (
+            data_categories.drop_duplicates("labels")
+            .set_index("labels")["level1"]
+            .astype(object)
+        )
+        category = skus.map(categories).fillna(unknown)
+        category_codes, category_labels = pd.factorize(category)
+
+        return cls(
+            item_labels,
+            {"brand": brand_codes, "category": category_codes},
+            {"brand": np.asarray(brands), "category": np.asarray(category_labels)},
+        )
+
+    def aggregate(self, transactions, level):
+        """ Returns ``transactions`` with the items replaced by their
+            ``level``, like ``arules::aggregate``.
+        """
+        if level == "sku":
+            return transactions
+        return _remap(transactions, self.levels[level], self.labels[level])
+
+    def add_aggregate(self, transactions, level):
+        """ Returns ``transactions`` with the ``level`` of the items added
+            next to the items themselves, like ``arules::addAggregate``.
+            The added items are labeled with a trailing ``*``.
+        """
+        n_items = transactions.n_items
+        codes = np.r_[self.levels["sku"], self.levels[level] + n_items]
+        labels = np.r_[
+            self.item_labels,
+            np.array([str(label) + "*" for label in self.labels[level]], dtype=object),
+        ]
+        both = Transactions(
+            np.r_[0, np.cumsum(2 * transactions.basket_sizes())],
+            np.column_stack(
+                [transactions.indices, transactions.indices + n_items]
+            ).ravel(),
+            np.empty(2 * n_items, dtype=object),
+        )
+        return _remap(both, codes, labels)
+
+
+def mine_levels(
+    transactions,
+    hierarchy,
+    levels=("category", "brand", "sku"),
+    min_support=0.001,
+    **options
+):
+    """ Mines the frequent itemsets of ``transactions`` at every one of
+        ``levels`` of ``hierarchy``.
+
+    Every level is remapped from the same loaded transactions, so the
+    baskets are read and interned only once. ``min_support`` is either
+    one value for all levels or a dict from level to support and other
+    ``options`` are passed to
+    :func:`src.models.itemsets.frequent_itemsets`.
+    """
+    if not isinstance(min_support, dict):
+        min_support = {level: min_support for level in levels}
+    return {
+        level: frequent_itemsets(
+            hierarchy.aggregate(transactions, level), min_support[level], **options
+        )
+        for level in levels
+    }
@@ -0,0 +1,367 @@
+"""
+.. module:: incremental.py
+    :synopsis: Frequent itemsets kept up to date as new baskets arrive.
+
+"""
+
+import numpy as np
+
+from src.data.transactions import Transactions
+from src.models.bitsets import count_itemsets
+from src.models.cooccurrence import basket_matrix
+from src.models.itemsets import FrequentItemsets, _apriori_candidates, absolute_support
+
+
+def _pair_rows(transactions, items):
+    """ Yields ``(item, other, count)`` for every item of ``items`` and
+        every item contained together with it in ``count > 0``
+        transactions.
+    """
+    matrix = basket_matrix(transactions)
+    rows = (matrix[:, items].T @ matrix).tocoo()
+    return zip(
+        np.asarray(items)[rows.row].tolist(), rows.col.tolist(), rows.data.tolist()
+    )
+
+
+def _immediate_subsets(itemset):
+    return [itemset[:k] + itemset[k + 1 :] for k in range(len(itemset))]
+
+
+def _pack(counts):
+    """ Returns the itemsets of ``counts`` as a CSR array of item ids
+        together with their counts.
+    """
+    itemsets = list(counts)
+    lengths = np.array([len(itemset) for itemset in itemsets], dtype=np.int64)
+    return (
+        np.r_[0, np.cumsum(lengths)].astype(np.int64),
+        np.array([item for itemset in itemsets for item in itemset], dtype=np.int64),
+        np.fromiter(counts.values(), dtype=np.int64, count=len(itemsets)),
+    )
+
+
+def _unpack(indptr, indices, counts):
+    indices = indices.tolist()
+    itemsets = [
+        tuple(indices[start:end])
+        for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist())
+    ]
+    return dict(zip(itemsets, counts.tolist()))
+
+
+class IncrementalItemsets:
+    """ Itemset counts that are updated from batches of new transactions
+        with a negative border (Thomas et al. 1997) instead of mining the
+        whole history again.
+
+    The itemsets contained in at least ``border_support`` of the
+    transactions, the large itemsets, are counted together with their
+    negative border: the itemsets that are not large but whose every
+    immediate subset is. Negative border itemsets contained in no
+    transaction are left out, so a new batch is counted for the counted
+    itemsets only.
+
+    When an itemset crosses the border its immediate supersets join the
+    negative border, but how many transactions of the history contain
+    them is not known. Instead of reading the history right away the
+    itemset is kept in ``deferred`` with its count before the batch,
+    which bounds the history count of each of those supersets, and the
+    batch counts of the supersets add up in ``partial``. The history is
+    read only once such a bound reaches ``min_support``, and then the
+    supersets of the deferred itemsets are counted exactly, so the gap
+    between ``border_support`` and ``min_support`` decides how often
+    that happens. The frequent itemsets are always among the counted
+    ones. Item ids follow ``vocabulary`` (sku -> item id).
+    """
+
+    def __init__(
+        self,
+        counts,
+        n_transactions,
+        vocabulary,
+        min_support,
+        border_support,
+        max_len=None,
+        deferred=None,
+        partial=None,
+    ):
+        if border_support > min_support:
+            raise ValueError(
+                "border_support must be at most min_support, got {} > {}".format(
+                    border_support, min_support
+                )
+            )
+        self.counts = counts
+        self.n_transactions = n_transactions
+        self.vocabulary = vocabulary
+        self.min_support = min_support
+        self.border_support = border_support
+        self.max_len = max_len
+        self.deferred = {} if deferred is None else deferred
+        self.partial = {} if partial is None else partial
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __repr__(self):
+        return "<IncrementalItemsets: {} itemsets from {} transactions>".format(
+            len(self), self.n_transactions
+        )
+
+    @property
+    def labels(self):
+        labels = np.empty(len(self.vocabulary), dtype=object)
+        labels[:] = list(self.vocabulary)
+        return labels
+
+    @property
+    def min_count(self):
+        return absolute_support(self.min_support, self.n_transactions)
+
+    @property
+    def border_count(self):
+        return absolute_support(self.border_support, self.n_transactions)
+
+    @classmethod
+    def from_transactions(
+        cls, transactions, min_support=0.001, border_support=None, max_len=None
+    ):
+        """ Counts the itemsets of ``transactions`` with a relative support
+            of at least ``border_support``, half of ``min_support`` by
+            default, and their negative border.
+        """
+        if border_support is None:
+            border_support = min_support / 2
+        itemsets = cls({}, 0, {}, min_support, border_support, max_len)
+        return itemsets.update(transactions, history=None)
+
+    def _align(self, transactions):
+        """ Returns ``transactions`` with item ids from the vocabulary,
+            adding the skus that are new.
+        """
+        ids = np.array(
+            [
+                self.vocabulary.setdefault(label, len(self.vocabulary))
+                for label in transactions.labels
+            ],
+            dtype=np.int64,
+        )
+        return Transactions(transactions.indptr, ids[transactions.indices], self.labels)
+
+    def update(self, delta, history):
+        """ Adds the transactions of ``delta`` to the counts.
+
+        ``history`` holds the transactions counted so far, either as
+        :class:`src.data.transactions.Transactions` or as a function that
+        loads them. It is read at most once, and only when a superset of a
+        deferred itemset may have become frequent.
+        """
+        delta = self._align(delta)
+        old_border = self.border_count
+        was_large = {
+            itemset for itemset, count in self.counts.items() if count >= old_border
+        }
+        n_transactions = self.n_transactions + delta.n_transactions
+        border = absolute_support(self.border_support, n_transactions)
+        min_count = absolute_support(self.min_support, n_transactions)
+
+        known = list(self.counts) + list(self.partial)
+        added = count_itemsets(delta, known).tolist()
+        counts = dict(zip(self.counts, added))
+        for itemset, count in self.counts.items():
+            counts[itemset] += count
+        partial = dict(zip(self.partial, added[len(self.counts) :]))
+        for itemset, count in self.partial.items():
+            partial[itemset] += count
+        # the items that were in no transaction so far
+        item_counts = delta.item_counts()
+        for item in np.flatnonzero(item_counts).tolist():
+            counts.setdefault((item,), int(item_counts[item]))
+
+        deferred = {
+            itemset: base
+            for itemset, base in self.deferred.items()
+            if counts[itemset] >= border
+        }
+        history_counts = {}
+        loaded = []
+
+        def load_history():
+            if not loaded:
+                loaded.append(self._align(history() if callable(history) else history))
+            return loaded[0]
+
+        def large(length):
+            return sorted(
+                itemset
+                for itemset, count in counts.items()
+                if len(itemset) == length and count >= border
+            )
+
+        def defer(level):
+            # the itemsets that crossed the border bound how many
+            # transactions of the history contain their supersets. Those
+            # that were in no transaction have supersets in none either
+            for itemset in level:
+                if itemset not in was_large:
+                    base = self.counts.get(itemset, history_counts.get(itemset, 0))
+                    if base:
+                        deferred[itemset] = base
+
+        def bounded(itemset):
+            return any(subset in deferred for subset in _immediate_subsets(itemset))
+
+        def may_be_frequent(itemsets):
+            for itemset in itemsets:
+                if itemset in partial:
+                    base = max(
+                        deferred[subset]
+                        for subset in _immediate_subsets(itemset)
+                        if subset in deferred
+                    )
+                    if base + partial[itemset] >= min_count:
+                        return True
+            return False
+
+        def resolve(found, length):
+            # counts are exact from now on, so the deferred itemsets of the
+            # level below no longer bound anything
+            for itemset, (history_count, delta_count) in found.items():
+                if history_count:
+                    history_counts[itemset] = history_count
+                if history_count + delta_count:
+                    counts[itemset] = history_count + delta_count
+                partial.pop(itemset, None)
+            for itemset in [s for s in deferred if len(s) == length - 1]:
+                del deferred[itemset]
+
+        singles = large(1)
+        if len(singles) > 1 and (self.max_len is None or self.max_len > 1):
+            defer(singles)
+            items = [itemset[0] for itemset in singles]
+            is_large = np.zeros(len(self.vocabulary), dtype=bool)
+            is_large[items] = True
+            # pairs are counted with sparse products, so pairs that are in
+            # no transaction are never listed
+            delta_counts = {}
+            for a, b, count in _pair_rows(delta, items):
+                if a < b and is_large[b] and (a, b) not in counts:
+                    delta_counts[a, b] = count
+                    if bounded((a, b)):
+                        partial.setdefault((a, b), count)
+                    else:
+                        counts[a, b] = count
+            if may_be_frequent(delta_counts):
+                pending = [s[0] for s in deferred if len(s) == 1]
+                found = {}
+                for a, b, count in _pair_rows(load_history(), pending):
+                    pair = (min(a, b), max(a, b))
+                    if a != b and is_large[b] and pair not in counts:
+                        # pairs of two deferred items are listed twice
+                        found[pair] = (count, delta_counts.get(pair, 0))
+                for pair in partial:
+                    if len(pair) == 2:
+                        found.setdefault(pair, (0, delta_counts.get(pair, 0)))
+                resolve(found, 2)
+
+        length = 3
+        while self.max_len is None or length <= self.max_len:
+            level = large(length - 1)
+            defer(level)
+            candidates = _apriori_candidates(level)
+            if not candidates:
+                break
+            exact = []
+            uncertain = []
+            for candidate in candidates:
+                if candidate in counts:
+                    continue
+                if bounded(candidate):
+                    uncertain.append(candidate)
+                else:
+                    # not counted before, so in no transaction of the history
+                    exact.append(candidate)
+            fresh = [c for c in uncertain if c not in partial]
+            found = count_itemsets(delta, exact + fresh).tolist()
+            for candidate, count in zip(exact, found):
+                if count:
+                    counts[candidate] = count
+            for candidate, count in zip(fresh, found[len(exact) :]):
+                if count:
+                    partial[candidate] = count
+            if uncertain and (loaded or may_be_frequent(uncertain)):
+                history_found = count_itemsets(load_history(), uncertain).tolist()
+                delta_found = count_itemsets(delta, uncertain).tolist()
+                resolve(dict(zip(uncertain, zip(history_found, delta_found))), length)
+            length += 1
+
+        self.counts = counts
+        self.n_transactions = n_transactions
+        self.deferred = deferred
+        # only the supersets that are still in the negative border are kept
+        self.partial = {
+            itemset: count
+            for itemset, count in partial.items()
+            if bounded(itemset)
+            and all(
+                counts.get(subset, 0) >= border
+                for subset in _immediate_subsets(itemset)
+            )
+        }
+        return self
+
+    def frequent(self):
+        """ Returns the itemsets whose support is at least ``min_support``.
+        """
+        min_count = self.min_count
+        counts = {
+            itemset: count
+            for itemset, count in self.counts.items()
+            if count >= min_count
+        }
+        return FrequentItemsets(counts, self.n_transactions, self.labels)
+
+    def save(self, filepath):
+        """ Saves the counts, the deferred itemsets and the partial counts
+            to a ``.npz`` file, with the itemsets stored as CSR arrays of
+            item ids.
+        """
+        arrays = {}
+        for name in ("counts", "deferred", "partial"):
+            indptr, indices, values = _pack(getattr(self, name))
+            arrays[name + "_indptr"] = indptr
+            arrays[name + "_indices"] = indices
+            arrays[name] = values
+        np.savez_compressed(
+            filepath,
+            labels=np.array(list(self.vocabulary), dtype=str),
+            state=np.array(
+                [self.n_transactions, -1 if self.max_len is None else self.max_len],
+                dtype=np.int64,
+            ),
+            supports=np.array([self.min_support, self.border_support]),
+            **arrays
+        )
+
+    @classmethod
+    def load(cls, filepath):
+        """ Loads counts saved with :meth:`save`.
+        """
+        with np.load(filepath) as data:
+            counts, deferred, partial = (
+                _unpack(data[name + "_indptr"], data[name + "_indices"], data[name])
+                for name in ("counts", "deferred", "partial")
+            )
+            n_transactions, max_len = data["state"].tolist()
+            min_support, border_support = data["supports"].tolist()
+            return cls(
+                counts,
+                n_transactions,
+                {label: i for i, label in enumerate(data["labels"].tolist())},
+                min_support,
+                border_support,
+                None if max_len < 0 else max_len,
+                deferred,
+                partial,
+            )
@@ -0,0 +1,286 @@
+"""
+.. module:: itemsets.py
+    :synopsis: Frequent itemset mining over vertical bitset tid-lists.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.models.bitsets import (
+    count_candidates,
+    count_itemsets,
+    popcount,
+    vertical_bitsets,
+)
+from src.models.cooccurrence import pair_counts
+from src.models.fpgrowth import fpgrowth
+from src.models.parallel import ShardedCounter
+
+
+class FrequentItemsets:
+    """ Absolute support counts of itemsets mined from transactions.
+
+    Itemsets are tuples of item ids sorted in ascending order and
+    ``labels`` maps the item ids back to skus.
+    """
+
+    def __init__(self, counts, n_transactions, labels):
+        self.counts = counts
+        self.n_transactions = n_transactions
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def __contains__(self, itemset):
+        return itemset in self.counts
+
+    def __getitem__(self, itemset):
+        return self.counts[itemset]
+
+    def __repr__(self):
+        return "<FrequentItemsets: {} itemsets from {} transactions>".format(
+            len(self), self.n_transactions
+        )
+
+    def support(self, itemset):
+        """ Returns the relative support of ``itemset``.
+        """
+        return self.counts[itemset] / self.n_transactions
+
+    def itemsets(self, length=None):
+        """ Returns the mined itemsets, optionally only those of one length.
+        """
+        if length is None:
+            return list(self.counts)
+        return [itemset for itemset in self.counts if len(itemset) == length]
+
+    def _subset(self, keep):
+        counts = {
+            itemset: count for itemset, count in self.counts.items() if keep(itemset)
+        }
+        return FrequentItemsets(counts, self.n_transactions, self.labels)
+
+    def _immediate_subsets(self):
+        """ Yields every itemset together with its subsets one item shorter.
+        """
+        for itemset, count in self.counts.items():
+            if len(itemset) > 1:
+                subsets = (itemset[:k] + itemset[k + 1 :] for k in range(len(itemset)))
+                yield count, subsets
+
+    def closed(self):
+        """ Returns the itemsets that have no superset with the same support,
+            like ``arules::is.closed``.
+        """
+        not_closed = set()
+        for count, subsets in self._immediate_subsets():
+            not_closed.update(s for s in subsets if self.counts[s] == count)
+        return self._subset(lambda itemset: itemset not in not_closed)
+
+    def maximal(self):
+        """ Returns the itemsets that have no frequent superset, like
+            ``arules::is.maximal``.
+        """
+        not_maximal = set()
+        for _, subsets in self._immediate_subsets():
+            not_maximal.update(subsets)
+        return self._subset(lambda itemset: itemset not in not_maximal)
+
+    def to_frame(self):
+        """ Returns the itemsets as a data frame sorted by support.
+        """
+        data = pd.DataFrame(
+            {
+                "items": [[self.labels[i] for i in s] for s in self.counts],
+                "count": np.fromiter(self.counts.values(), dtype=np.int64),
+            }
+        )
+        data["support"] = data["count"] / self.n_transactions
+        return data.sort_values("count", ascending=False).reset_index(drop=True)
+
+
+def absolute_support(min_support, n_transactions):
+    """ Converts a relative minimum support to an absolute transaction count.
+    """
+    return max(1, int(np.ceil(min_support * n_transactions - 1e-9)))
+
+
+def frequent_pairs(transactions, min_count, frequent):
+    """ Returns the frequent pairs of the ``frequent`` items as
+        ``(first, second, count)`` arrays of positions in ``frequent``
+        with ``first < second``, sorted by ``first`` and then ``second``.
+
+    The pairs are counted with one sparse co-occurrence product, so pairs
+    of items that are never bought together cost nothing.
+    """
+    position = np.full(transactions.n_items, -1, dtype=np.int64)
+    position[frequent] = np.arange(len(frequent))
+    first, second, pair_support, _ = pair_counts(transactions, min_count)
+    first = position[first]
+    second = position[second]
+    # a frequent pair only holds frequent items, every pair is kept once
+    keep = first < second
+    first, second, pair_support = first[keep], second[keep], pair_support[keep]
+    order = np.lexsort((second, first))
+    return first[order], second[order], pair_support[order]
+
+
+def eclat(transactions, min_count, max_len=None):
+    """ Mines all itemsets contained in at least ``min_count`` transactions.
+
+    Depth first Eclat over bitset tid-lists: the tid-list of every
+    extension of an itemset is intersected and popcounted against all of
+    its siblings at once. The second level is seeded from
+    :func:`frequent_pairs`, so an item is only intersected with the items
+    it is frequently bought with.
+    """
+    item_counts = transactions.item_counts()
+    frequent = np.flatnonzero(item_counts >= min_count)
+    # extending the rarest items first keeps the intersections small
+    frequent = frequent[np.argsort(item_counts[frequent], kind="mergesort")]
+    counts = {(int(item),): int(item_counts[item]) for item in frequent}
+    if (max_len is not None and max_len < 2) or len(frequent) < 2:
+        return counts
+
+    def extend(prefix, items, bitsets):
+        for k in range(len(items) - 1):
+            itemset = prefix + (int(items[k]),)
+            joint = bitsets[k] & bitsets[k + 1 :]
+            supports = popcount(joint)
+            keep = np.flatnonzero(supports >= min_count)
+            if not len(keep):
+                continue
+            extensions = items[k + 1 :][keep]
+            for item, support in zip(extensions, supports[keep]):
+                counts[tuple(sorted(itemset + (int(item),)))] = int(support)
+            if max_len is None or len(itemset) + 1 < max_len:
+                extend(itemset, extensions, joint[keep])
+
+    first, second, pair_support = frequent_pairs(transactions, min_count, frequent)
+    for a, b, support in zip(frequent[first], frequent[second], pair_support):
+        counts[tuple(sorted((int(a), int(b))))] = int(support)
+    if max_len is not None and max_len <= 2:
+        return counts
+
+    bitsets = vertical_bitsets(transactions, frequent)
+    starts = np.flatnonzero(np.r_[True, first[1:] != first[:-1]])
+    for start, end in zip(starts, np.r_[starts[1:], len(first)]):
+        partners = second[start:end]
+        if len(partners) > 1:
+            extend(
+                (int(frequent[first[start]]),),
+                frequent[partners],
+                bitsets[first[start]] & bitsets[partners],
+            )
+    return counts
+
+
+def _apriori_candidates(level):
+    """ Joins the sorted frequent itemsets of one length into candidates one
+        item longer whose every subset is frequent.
+    """
+    frequent = set(level)
+    candidates = []
+    start = 0
+    while start < len(level):
+        prefix = level[start][:-1]
+        end = start + 1
+        while end < len(level) and level[end][:-1] == prefix:
+            end += 1
+        for a in range(start, end):
+            for b in range(a + 1, end):
+                candidate = level[a] + level[b][-1:]
+                if all(
+                    candidate[:k] + candidate[k + 1 :] in frequent
+                    for k in range(len(candidate) - 2)
+                ):
+                    candidates.append(candidate)
+        start = end
+    return candidates
+
+
+def apriori(transactions, min_count, max_len=None, n_jobs=1):
+    """ Mines all itemsets contained in at least ``min_count`` transactions
+        level by level with Apriori.
+
+    The pairs are read from :func:`frequent_pairs` instead of counting
+    every pair of frequent items, and the longer candidates are joined
+    from them. With ``n_jobs`` above one the candidates of every further
+    level are counted in parallel over shards of the transactions, see
+    :class:`src.models.parallel.ShardedCounter`.
+    """
+    item_counts = transactions.item_counts()
+    frequent = np.flatnonzero(item_counts >= min_count)
+    counts = {(int(item),): int(item_counts[item]) for item in frequent}
+    if (max_len is not None and max_len < 2) or len(frequent) < 2:
+        return counts
+
+    first, second, pair_support = frequent_pairs(transactions, min_count, frequent)
+    level = list(zip(frequent[first].tolist(), frequent[second].tolist()))
+    counts.update(zip(level, pair_support.tolist()))
+    if max_len is not None and max_len <= 2:
+        return counts
+
+    candidates = np.array(_apriori_candidates(level), dtype=np.int64)
+    if not len(candidates):
+        # no pool is started when there is nothing left to count
+        return counts
+    counter = ShardedCounter(transactions, n_jobs) if n_jobs != 1 else None
+    try:
+        length = 3
+        while len(candidates):
+            if counter is None:
+                supports = count_candidates(transactions, candidates)
+            else:
+                supports = counter(candidates)
+            kept = supports >= min_count
+            level = [tuple(int(i) for i in row) for row in candidates[kept]]
+            counts.update(zip(level, supports[kept].tolist()))
+            if max_len is not None and length >= max_len:
+                break
+            candidates = np.array(_apriori_candidates(level), dtype=np.int64)
+            length += 1
+    finally:
+        if counter is not None:
+            counter.close()
+    return counts
+
+
+MINERS = {"apriori": apriori, "eclat": eclat, "fpgrowth": fpgrowth}
+
+
+def get_miner(method):
+    """ Returns the mining function of ``method``, which is called with
+        transactions and an absolute minimum support count.
+    """
+    if method not in MINERS:
+        raise ValueError(
+            "method must be one of {}, got {!r}".format(sorted(MINERS), method)
+        )
+    return MINERS[method]
+
+
+def frequent_itemsets(
+    transactions, min_support=0.001, max_len=None, method="eclat", n_jobs=1
+):
+    """ Mines the itemsets of ``transactions`` whose relative support is at
+        least ``min_support``, the Python counterpart of
+        ``arules::apriori(..., target='frequent itemsets')``. ``n_jobs``
+        parallel processes, at most ``os.cpu_count()``, can be used with
+        the apriori method.
+    """
+    miner = get_miner(method)
+    options = {}
+    if n_jobs != 1:
+        if method != "apriori":
+            raise ValueError("n_jobs is only supported by method='apriori'")
+        options["n_jobs"] = n_jobs
+
+    threshold = absolute_support(min_support, transactions.n_transactions)
+    counts = miner(transactions, threshold, max_len=max_len, **options)
+    return FrequentItemsets(counts, transactions.n_transactions, transactions.labels)
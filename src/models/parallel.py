@@ -0,0 +1,175 @@
+"""
+.. module:: parallel.py
+    :synopsis: Support counting over transaction shards in a process pool.
+
+"""
+
+import os
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+
+from src.data.transactions import Transactions
+from src.models.bitsets import count_candidates
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# arrays attached by the worker processes of a pool
+_attached = {}
+
+
+class SharedArray:
+    """ A copy of a numpy array in memory that other processes can attach
+        to by name instead of receiving a pickled copy.
+
+    Uses ``multiprocessing.shared_memory`` where available and a memory
+    mapped temporary file otherwise, which the operating system shares
+    between processes the same way.
+    """
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.name = None
+        self._segment = None
+        if array.size == 0:
+            self.array = array
+            return
+
+        if shared_memory is not None:
+            self._segment = shared_memory.SharedMemory(create=True, size=array.nbytes)
+            self.name = self._segment.name
+            self.array = np.ndarray(
+                array.shape, dtype=array.dtype, buffer=self._segment.buf
+            )
+        else:
+            handle, self.name = tempfile.mkstemp(suffix=".shared")
+            os.close(handle)
+            self.array = np.memmap(
+                self.name, dtype=array.dtype, mode="w+", shape=array.shape
+            )
+        self.array[...] = array
+
+    @property
+    def descriptor(self):
+        """ What a process needs to attach to the array.
+        """
+        return self.name, self.shape, self.dtype
+
+    @staticmethod
+    def attach(descriptor):
+        """ Returns the array behind ``descriptor`` together with the handle
+            that has to be kept alive while the array is used.
+        """
+        name, shape, dtype = descriptor
+        if name is None:
+            return np.empty(shape, dtype=dtype), None
+        if shared_memory is None:
+            return np.memmap(name, dtype=dtype, mode="r", shape=shape), None
+
+        segment = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=segment.buf), segment
+
+    def close(self):
+        """ Releases the shared memory. Attached arrays become invalid.
+        """
+        if self.name is None:
+            return
+        if self._segment is not None:
+            self.array = None
+            self._segment.close()
+            self._segment.unlink()
+        else:
+            del self.array
+            os.remove(self.name)
+        self.name = None
+
+
+def _attach_matrix(indptr, indices, n_items):
+    _attached["indptr"] = SharedArray.attach(indptr)
+    _attached["indices"] = SharedArray.attach(indices)
+    _attached["n_items"] = n_items
+
+
+def _count_shard(task):
+    """ Counts the candidates in the transactions ``start:end``.
+    """
+    start, end, candidates = task
+    candidates, handle = SharedArray.attach(candidates)
+    indptr = _attached["indptr"][0][start : end + 1]
+    indices = _attached["indices"][0][indptr[0] : indptr[-1]]
+    shard = Transactions(
+        indptr - indptr[0], indices, np.empty(_attached["n_items"], dtype=object)
+    )
+    counts = count_candidates(shard, candidates)
+    del candidates
+    if handle is not None:
+        handle.close()
+    return counts
+
+
+class ShardedCounter:
+    """ Counts candidate supports in parallel over row blocks of the CSR
+        transaction matrix.
+
+    The matrix is copied to shared memory once and every worker process
+    attaches to it, so neither the matrix nor the candidates are pickled.
+    Each worker counts the candidates in its own shard of transactions
+    and the counts of the shards are summed. ``n_jobs`` is capped at
+    ``os.cpu_count()``, as more processes than cores only add overhead,
+    and defaults to it. Use as a context manager so the pool and the
+    shared memory are released.
+    """
+
+    def __init__(self, transactions, n_jobs=None):
+        cpu_count = os.cpu_count() or 1
+        self.n_jobs = min(n_jobs or cpu_count, cpu_count)
+        self._indptr = SharedArray(transactions.indptr)
+        self._indices = SharedArray(transactions.indices)
+        self._pool = Pool(
+            self.n_jobs,
+            initializer=_attach_matrix,
+            initargs=(
+                self._indptr.descriptor,
+                self._indices.descriptor,
+                transactions.n_items,
+            ),
+        )
+
+        # shards of about the same number of line items
+        n_transactions = transactions.n_transactions
+        targets = np.linspace(0, transactions.indptr[-1], self.n_jobs + 1)
+        bounds = np.searchsorted(transactions.indptr, targets[1:-1])
+        bounds = np.unique(np.r_[0, bounds, n_transactions])
+        self.shards = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, candidates):
+        """ Counts the transactions that contain each row of
+            ``candidates``.
+        """
+        if not self.shards:
+            return np.zeros(len(candidates), dtype=np.int64)
+        candidates = SharedArray(np.asarray(candidates, dtype=np.int64))
+        try:
+            tasks = [(start, end, candidates.descriptor) for start, end in self.shards]
+            counts = self._pool.map(_count_shard, tasks)
+        finally:
+            candidates.close()
+        return np.sum(counts, axis=0, dtype=np.int64)
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+        self._indptr.close()
+        self._indices.close()
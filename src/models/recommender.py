@@ -0,0 +1,154 @@
+"""
+.. module:: recommender.py
+    :synopsis: Frequently bought together recommendations from mined rules.
+
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from src.models.store import open_store
+
+
+class Recommender:
+    """ Recommends the consequents of the rules that apply to a basket.
+
+    A rule applies when its whole antecedent is in the basket. Rules are
+    found through an inverted index from every item to the rules whose
+    antecedent contains it: a rule applies exactly when it is hit by as
+    many basket items as its antecedent has. Every consequent is scored
+    by the best ``score`` among its applying rules, ties broken by
+    support, and recommendations of the same basket are cached.
+    """
+
+    def __init__(self, rules, score="confidence", cache_size=4096):
+        self.labels = np.asarray(rules.labels, dtype=object)
+        self.ids = {label: i for i, label in enumerate(self.labels.tolist())}
+        self.scores = np.asarray(getattr(rules, score), dtype=np.float64)
+        self.supports = np.asarray(rules.count_ab, dtype=np.int64)
+        self.consequents = np.array(
+            [rules.itemsets[k][0] for k in rules.consequent.tolist()], dtype=np.int64
+        )
+
+        antecedents = [rules.itemsets[k] for k in rules.antecedent.tolist()]
+        self.antecedent_lengths = np.array(
+            [len(antecedent) for antecedent in antecedents], dtype=np.int64
+        )
+        items = np.array(
+            [item for antecedent in antecedents for item in antecedent], dtype=np.int64
+        )
+        rule_ids = np.repeat(np.arange(len(antecedents)), self.antecedent_lengths)
+        order = np.argsort(items, kind="mergesort")
+        self.index_rules = rule_ids[order]
+        self.index_indptr = np.r_[
+            0, np.cumsum(np.bincount(items, minlength=len(self.labels)))
+        ]
+        self._cached = lru_cache(maxsize=cache_size)(self._recommend)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __repr__(self):
+        return "<Recommender: {} rules>".format(len(self))
+
+    @classmethod
+    def from_store(cls, directory, **options):
+        """ Builds a recommender from a rule store, see
+            :mod:`src.models.store`.
+        """
+        return cls(open_store(directory).rules(), **options)
+
+    def _recommend_items(self, baskets, n):
+        """ Recommends for baskets given as sorted arrays of unique item ids.
+        """
+        baskets = [basket.astype(np.int64) for basket in baskets]
+        sizes = np.array([len(basket) for basket in baskets], dtype=np.int64)
+        items = np.concatenate(baskets) if baskets else np.zeros(0, dtype=np.int64)
+        owners = np.repeat(np.arange(len(baskets)), sizes)
+
+        # every (basket, rule) hit of the inverted index
+        starts = self.index_indptr[items]
+        lengths = self.index_indptr[items + 1] - starts
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        rules = self.index_rules[np.repeat(starts, lengths) + offsets]
+        owners_of_hits = np.repeat(owners, lengths)
+        n_rules = len(self.scores)
+        keys, counts = np.unique(owners_of_hits * n_rules + rules, return_counts=True)
+        owners_of_hits, rules = keys // n_rules, keys % n_rules
+        applies = counts == self.antecedent_lengths[rules]
+        owners_of_hits, rules = owners_of_hits[applies], rules[applies]
+
+        # consequents already in the basket are not recommended
+        n_items = len(self.labels)
+        in_basket = np.isin(
+            owners_of_hits * n_items + self.consequents[rules], owners * n_items + items
+        )
+        owners_of_hits, rules = owners_of_hits[~in_basket], rules[~in_basket]
+
+        # the best rule of every basket and consequent, then the best n of
+        # every basket
+        consequents = self.consequents[rules]
+        order = np.lexsort(
+            (-self.supports[rules], -self.scores[rules], consequents, owners_of_hits)
+        )
+        owners_of_hits, rules = owners_of_hits[order], rules[order]
+        consequents = consequents[order]
+        first = np.ones(len(rules), dtype=bool)
+        first[1:] = (owners_of_hits[1:] != owners_of_hits[:-1]) | (
+            consequents[1:] != consequents[:-1]
+        )
+        owners_of_hits, rules = owners_of_hits[first], rules[first]
+        order = np.lexsort(
+            (
+                self.consequents[rules],
+                -self.supports[rules],
+                -self.scores[rules],
+                owners_of_hits,
+            )
+        )
+        owners_of_hits, rules = owners_of_hits[order], rules[order]
+        bounds = np.searchsorted(owners_of_hits, np.arange(len(baskets) + 1))
+
+        labels = self.labels[self.consequents[rules]].tolist()
+        scores = self.scores[rules].tolist()
+        return [
+            list(
+                zip(
+                    labels[start : min(stop, start + n)],
+                    scores[start : min(stop, start + n)],
+                )
+            )
+            for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+        ]
+
+    def recommend(self, basket, n=10):
+        """ Returns up to ``n`` ``(sku, score)`` pairs for the skus of
+            ``basket``, best first. Unknown skus are ignored.
+        """
+        items = tuple(sorted({self.ids[sku] for sku in basket if sku in self.ids}))
+        return list(self._cached(items, n))
+
+    def recommend_batch(self, baskets, n=10):
+        """ Returns the recommendations of every basket of ``baskets``.
+
+        All baskets are looked up at once: the rules hit by every basket are
+        gathered into one array keyed by basket and rule, so the whole batch
+        takes a handful of vectorized operations instead of one lookup per
+        basket.
+        """
+        return self._recommend_items(
+            [
+                np.unique([self.ids[sku] for sku in basket if sku in self.ids])
+                for basket in baskets
+            ],
+            n,
+        )
+
+    def _recommend(self, items, n):
+        return tuple(self._recommend_items([np.array(items, dtype=np.int64)], n)[0])
+
+    def cache_info(self):
+        return self._cached.cache_info()
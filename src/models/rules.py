@@ -0,0 +1,533 @@
+"""
+.. module:: rules.py
+    :synopsis: Association rules stored as NumPy columns.
+
+"""
+
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+from scipy.special import chdtrc
+
+from src.data.transactions import Transactions
+from src.models.bitsets import count_itemsets, popcount, vertical_bitsets
+from src.models.cooccurrence import cooccurrence, pair_counts
+from src.models.itemsets import absolute_support, frequent_itemsets, get_miner
+
+
+class Appearance:
+    """ Restricts the items that may appear in the rules, like
+        ``arules::apriori(..., appearance=list(rhs=..., default='lhs'))``.
+
+    Only the labels in ``rhs`` can be consequents and they never appear
+    in antecedents. Antecedents never contain ``lhs_exclude``. Without
+    ``rhs`` any item can be a consequent.
+    """
+
+    def __init__(self, rhs=None, lhs_exclude=()):
+        self.rhs = None if rhs is None else list(rhs)
+        self.lhs_exclude = list(lhs_exclude)
+
+    def __repr__(self):
+        return "<Appearance: rhs={!r}, lhs_exclude={!r}>".format(
+            self.rhs, self.lhs_exclude
+        )
+
+    def item_masks(self, labels):
+        """ Returns boolean masks over the item ids of ``labels`` telling
+            which items may be consequents and which antecedent items.
+        """
+        labels = pd.Index(np.asarray(labels, dtype=object))
+        if self.rhs is None:
+            rhs = np.ones(len(labels), dtype=bool)
+            lhs = np.ones(len(labels), dtype=bool)
+        else:
+            rhs = labels.isin(self.rhs)
+            lhs = ~rhs
+        lhs &= ~labels.isin(self.lhs_exclude)
+        return rhs, lhs
+
+
+class RuleTable:
+    """ Association rules ``antecedent -> consequent`` stored column-wise.
+
+    ``antecedent`` and ``consequent`` are ids into ``itemsets``, a list of
+    item id tuples, and ``count_a``, ``count_b`` and ``count_ab`` are the
+    absolute supports of the antecedent, the consequent and their union.
+    All quality measures are computed from these columns for the whole
+    table at once.
+    """
+
+    def __init__(
+        self,
+        itemsets,
+        antecedent,
+        consequent,
+        count_a,
+        count_b,
+        count_ab,
+        n_transactions,
+        labels,
+    ):
+        self.itemsets = itemsets
+        self.antecedent = np.asarray(antecedent, dtype=np.int64)
+        self.consequent = np.asarray(consequent, dtype=np.int64)
+        self.count_a = np.asarray(count_a, dtype=np.int64)
+        self.count_b = np.asarray(count_b, dtype=np.int64)
+        self.count_ab = np.asarray(count_ab, dtype=np.int64)
+        self.n_transactions = n_transactions
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.antecedent)
+
+    def __repr__(self):
+        return "<RuleTable: {} rules>".format(len(self))
+
+    def __getitem__(self, selection):
+        """ Returns the rules picked by a boolean mask or an index array, like
+            ``arules::subset``.
+        """
+        return RuleTable(
+            self.itemsets,
+            self.antecedent[selection],
+            self.consequent[selection],
+            self.count_a[selection],
+            self.count_b[selection],
+            self.count_ab[selection],
+            self.n_transactions,
+            self.labels,
+        )
+
+    @property
+    def support(self):
+        return self.count_ab / self.n_transactions
+
+    @property
+    def confidence(self):
+        return self.count_ab / self.count_a
+
+    @property
+    def lift(self):
+        return self.n_transactions * self.count_ab / (self.count_a * self.count_b)
+
+    @property
+    def leverage(self):
+        n = self.n_transactions
+        return self.count_ab / n - (self.count_a / n) * (self.count_b / n)
+
+    @property
+    def conviction(self):
+        with np.errstate(divide="ignore"):
+            return (1 - self.count_b / self.n_transactions) / (1 - self.confidence)
+
+    @property
+    def chi_squared(self):
+        """ Chi-squared statistic of the 2x2 contingency table of the
+            antecedent and the consequent.
+        """
+        n = float(self.n_transactions)
+        a = self.count_a.astype(np.float64)
+        b = self.count_b.astype(np.float64)
+        ab = self.count_ab.astype(np.float64)
+        numerator = n * (ab * n - a * b) ** 2
+        denominator = a * (n - a) * b * (n - b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            chi_squared = numerator / denominator
+        # an item in every transaction is independent of everything
+        chi_squared[denominator == 0] = 0.0
+        return chi_squared
+
+    def p_value(self, adjust=None):
+        """ P-values of the chi-squared test of independence, optionally
+            bonferroni adjusted for the number of rules in the table.
+        """
+        p_value = chdtrc(1, self.chi_squared)
+        if adjust == "bonferroni":
+            return np.minimum(p_value * len(self), 1.0)
+        if adjust is not None:
+            raise ValueError("adjust must be None or 'bonferroni'")
+        return p_value
+
+    def is_significant(self, alpha=0.01, adjust="bonferroni"):
+        """ Tells which rules are significant in a chi-squared test, like
+            ``arules::is.significant(..., method='chisq')``.
+        """
+        return self.p_value(adjust) <= alpha
+
+    def is_redundant(self, measure="confidence"):
+        """ Tells which rules have a more general rule in the table, one with
+            the same consequent and an antecedent that is a proper subset,
+            whose ``measure`` is at least as high, like
+            ``arules::is.redundant``.
+
+        The best measure over the more general rules is built up from the
+        immediate subsets of every antecedent through a hash index, so every
+        rule is compared against its parents only and not against all other
+        rules.
+        """
+        values = getattr(self, measure)
+        present = {
+            (self.itemsets[a], c): value
+            for a, c, value in zip(
+                self.antecedent.tolist(), self.consequent.tolist(), values.tolist()
+            )
+        }
+        best = {}
+
+        def best_general(antecedent, consequent):
+            key = (antecedent, consequent)
+            if key not in best:
+                value = -np.inf
+                if len(antecedent) > 1:
+                    for k in range(len(antecedent)):
+                        parent = antecedent[:k] + antecedent[k + 1 :]
+                        value = max(
+                            value,
+                            present.get((parent, consequent), -np.inf),
+                            best_general(parent, consequent),
+                        )
+                best[key] = value
+            return best[key]
+
+        return np.array(
+            [
+                best_general(self.itemsets[a], c) >= value
+                for a, c, value in zip(
+                    self.antecedent.tolist(), self.consequent.tolist(), values.tolist()
+                )
+            ],
+            dtype=bool,
+        )
+
+    def quality(self):
+        """ Returns all quality measures as a data frame, computed in one
+            pass over the support columns.
+        """
+        n = float(self.n_transactions)
+        s_a = self.count_a / n
+        s_b = self.count_b / n
+        s_ab = self.count_ab / n
+        confidence = s_ab / s_a
+        expected = s_a * s_b
+        denominator = expected * (1 - s_a) * (1 - s_b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            conviction = (1 - s_b) / (1 - confidence)
+            chi_squared = n * (s_ab - expected) ** 2 / denominator
+        chi_squared[denominator == 0] = 0.0
+        return pd.DataFrame(
+            {
+                "support": s_ab,
+                "confidence": confidence,
+                "lift": s_ab / expected,
+                "leverage": s_ab - expected,
+                "conviction": conviction,
+                "chi_squared": chi_squared,
+                "p_value": chdtrc(1, chi_squared),
+                "count": self.count_ab,
+            }
+        )
+
+    def to_frame(self):
+        """ Returns the rules with sku labels and quality measures.
+        """
+        data = pd.DataFrame(
+            {
+                "lhs": [
+                    [self.labels[i] for i in self.itemsets[k]] for k in self.antecedent
+                ],
+                "rhs": [
+                    [self.labels[i] for i in self.itemsets[k]] for k in self.consequent
+                ],
+            }
+        )
+        return pd.concat([data, self.quality()], axis=1)
+
+
+def generate_rules(frequent, min_confidence=0.5, min_len=2, max_len=None):
+    """ Generates the rules with a single item consequent from frequent
+        itemsets, like ``arules::apriori(..., target='rules')``.
+
+    ``min_len`` and ``max_len`` limit the number of items in a rule,
+    antecedent and consequent together.
+    """
+    counts = frequent.counts
+    itemsets = list(counts)
+    ids = {itemset: k for k, itemset in enumerate(itemsets)}
+
+    antecedent = []
+    consequent = []
+    count_ab = []
+    for itemset, count in counts.items():
+        if len(itemset) < max(min_len, 2):
+            continue
+        if max_len is not None and len(itemset) > max_len:
+            continue
+        for k, item in enumerate(itemset):
+            antecedent.append(ids[itemset[:k] + itemset[k + 1 :]])
+            consequent.append(ids[(item,)])
+            count_ab.append(count)
+    antecedent = np.array(antecedent, dtype=np.int64)
+    consequent = np.array(consequent, dtype=np.int64)
+    itemset_counts = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+    rules = RuleTable(
+        itemsets,
+        antecedent,
+        consequent,
+        itemset_counts[antecedent],
+        itemset_counts[consequent],
+        count_ab,
+        frequent.n_transactions,
+        frequent.labels,
+    )
+    return rules[rules.confidence >= min_confidence]
+
+
+def pair_rules(transactions, min_support=0.0, min_confidence=0.0, **options):
+    """ Returns every rule with one item on both sides, with their
+        supports, lifts and the other measures, from one
+        :func:`src.models.cooccurrence.cooccurrence` pass instead of a
+        mining run.
+
+    The options are passed to
+    :func:`src.models.cooccurrence.cooccurrence`, for example
+    ``block_size`` to bound the memory the counting takes.
+    """
+    min_count = absolute_support(min_support, transactions.n_transactions)
+    antecedent, consequent, count_ab, item_counts = pair_counts(
+        transactions, min_count, **options
+    )
+    rules = RuleTable(
+        [(item,) for item in range(transactions.n_items)],
+        antecedent,
+        consequent,
+        item_counts[antecedent],
+        item_counts[consequent],
+        count_ab,
+        transactions.n_transactions,
+        transactions.labels,
+    )
+    return rules[rules.confidence >= min_confidence]
+
+
+def _project(transactions, item, allowed):
+    """ Returns the transactions that contain ``item`` keeping only the
+        ``allowed`` items. Item ids are unchanged.
+    """
+    rows = transactions.row_ids()
+    contains = np.zeros(transactions.n_transactions, dtype=bool)
+    contains[rows[transactions.indices == item]] = True
+    keep = contains[rows] & allowed[transactions.indices]
+    sizes = np.bincount(rows[keep], minlength=transactions.n_transactions)
+    sizes = sizes[contains]
+    return Transactions(
+        np.r_[0, np.cumsum(sizes)], transactions.indices[keep], transactions.labels
+    )
+
+
+def mine_rules(
+    transactions,
+    min_support=0.001,
+    min_confidence=0.5,
+    min_len=2,
+    max_len=None,
+    appearance=None,
+    method="eclat",
+):
+    """ Mines the rules of ``transactions`` with a single item consequent,
+        like ``arules::apriori(..., target='rules')``.
+
+    With an :class:`Appearance` the constraints are pushed into the
+    search: the antecedents of every allowed consequent are mined only
+    from the transactions that contain it, using only the items allowed
+    in antecedents, so itemsets that cannot form an allowed rule are
+    never generated.
+    """
+    if appearance is None:
+        frequent = frequent_itemsets(transactions, min_support, max_len, method)
+        return generate_rules(frequent, min_confidence, min_len, max_len)
+
+    miner = get_miner(method)
+    min_count = absolute_support(min_support, transactions.n_transactions)
+
+    rhs, lhs = appearance.item_masks(transactions.labels)
+    item_counts = transactions.item_counts()
+    consequents = np.flatnonzero(rhs & (item_counts >= min_count))
+
+    antecedent_len = None if max_len is None else max_len - 1
+    joint = {}
+    for item in consequents.tolist():
+        allowed = lhs.copy()
+        allowed[item] = False
+        if antecedent_len == 0 or not allowed.any():
+            continue
+        projected = _project(transactions, item, allowed)
+        for itemset, count in miner(projected, min_count, antecedent_len).items():
+            if len(itemset) + 1 >= min_len:
+                joint[itemset, item] = count
+
+    antecedents = list({itemset for itemset, _ in joint})
+    antecedent_counts = dict(
+        zip(antecedents, count_itemsets(transactions, antecedents).tolist())
+    )
+    rules = _rule_table(
+        transactions,
+        [
+            (itemset, item, antecedent_counts[itemset], count)
+            for (itemset, item), count in joint.items()
+        ],
+    )
+    return rules[rules.confidence >= min_confidence]
+
+
+def _rule_table(transactions, rules):
+    """ Builds a :class:`RuleTable` from ``(antecedent, consequent item,
+        antecedent count, rule count)`` tuples.
+    """
+    item_counts = transactions.item_counts()
+    itemsets = list(
+        dict.fromkeys(
+            [itemset for itemset, _, _, _ in rules]
+            + [(item,) for _, item, _, _ in rules]
+        )
+    )
+    ids = {itemset: k for k, itemset in enumerate(itemsets)}
+    return RuleTable(
+        itemsets,
+        [ids[itemset] for itemset, _, _, _ in rules],
+        [ids[(item,)] for _, item, _, _ in rules],
+        [count_a for _, _, count_a, _ in rules],
+        [item_counts[item] for _, item, _, _ in rules],
+        [count_ab for _, _, _, count_ab in rules],
+        transactions.n_transactions,
+        transactions.labels,
+    )
+
+
+def top_k_rules(
+    transactions, k=100, measure="lift", min_support=0.0, max_len=None, appearance=None
+):
+    """ Returns the ``k`` best rules by ``measure``, ``"lift"`` or
+        ``"confidence"``, with ties broken by support, without a minimum
+        support to tune.
+
+    Antecedents are searched depth first for one consequent at a time
+    over bitset tid-lists, starting from the consequents with the
+    highest upper bound: confidence is at most one and lift at most
+    ``n / count(consequent)``, and the support of a rule never grows when
+    its antecedent is extended. The k best rules found so far are kept
+    in a heap whose smallest rule is a bound that rises during the search
+    and cuts every branch and consequent that can no longer beat it.
+    ``min_support`` is an optional floor and ``appearance`` restricts the
+    items like in :func:`mine_rules`.
+    """
+    if measure not in ("lift", "confidence"):
+        raise ValueError(
+            "measure must be 'lift' or 'confidence', got {!r}".format(measure)
+        )
+    n = transactions.n_transactions
+    min_count = absolute_support(min_support, n)
+    if appearance is None:
+        appearance = Appearance()
+    rhs, lhs = appearance.item_masks(transactions.labels)
+    item_counts = transactions.item_counts()
+    frequent = item_counts >= min_count
+    consequents = np.flatnonzero(rhs & frequent)
+    if measure == "lift":
+        bounds = n / item_counts[consequents]
+    else:
+        bounds = np.ones(len(consequents))
+    order = np.lexsort((-item_counts[consequents], -bounds))
+
+    heap = []
+    tiebreak = itertools.count()
+
+    def threshold():
+        if len(heap) < k:
+            return (-np.inf, min_count - 1)
+        return heap[0][:2]
+
+    def offer(antecedent, item, count_a, count_ab):
+        if measure == "lift":
+            value = n * count_ab / (count_a * item_counts[item])
+        else:
+            value = count_ab / count_a
+        entry = (value, count_ab, next(tiebreak), antecedent, item, count_a)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def search(item, bound, prefix, items, tid_a, tid_ab, counts_a, counts_ab):
+        for j in range(len(items)):
+            if (bound, counts_ab[j]) <= threshold():
+                continue
+            antecedent = prefix + (int(items[j]),)
+            offer(antecedent, item, int(counts_a[j]), int(counts_ab[j]))
+            if j + 1 == len(items):
+                continue
+            if max_len is not None and len(antecedent) + 1 >= max_len:
+                continue
+            joint_ab = tid_ab[j] & tid_ab[j + 1 :]
+            supports_ab = popcount(joint_ab)
+            floor = threshold()
+            keep = np.flatnonzero(
+                (supports_ab >= min_count)
+                & ((bound > floor[0]) | (supports_ab > floor[1]))
+            )
+            if not len(keep):
+                continue
+            joint_a = tid_a[j] & tid_a[j + 1 :][keep]
+            search(
+                item,
+                bound,
+                antecedent,
+                items[j + 1 :][keep],
+                joint_a,
+                joint_ab[keep],
+                popcount(joint_a),
+                supports_ab[keep],
+            )
+
+    if k > 0 and (max_len is None or max_len > 1) and len(consequents):
+        pairs = cooccurrence(transactions, dense=False)
+        bitsets = vertical_bitsets(transactions)
+        for item, bound in zip(consequents[order].tolist(), bounds[order].tolist()):
+            floor = threshold()
+            if bound < floor[0]:
+                break
+            if (bound, item_counts[item]) <= floor:
+                continue
+            row = pairs[item]
+            keep = (
+                (row.data >= min_count)
+                & lhs[row.indices]
+                & (row.indices != item)
+                & ((bound > floor[0]) | (row.data > floor[1]))
+            )
+            # the most frequent antecedents first raise the heap bound early
+            keep = np.flatnonzero(keep)[np.argsort(-row.data[keep], kind="mergesort")]
+            items = row.indices[keep].astype(np.int64)
+            tid_a = bitsets[items]
+            search(
+                item,
+                bound,
+                (),
+                items,
+                tid_a,
+                tid_a & bitsets[item],
+                item_counts[items],
+                row.data[keep].astype(np.int64),
+            )
+
+    rules = _rule_table(
+        transactions,
+        [
+            (tuple(sorted(antecedent)), item, count_a, count_ab)
+            for _, count_ab, _, antecedent, item, count_a in heap
+        ],
+    )
+    return rules[np.lexsort((-rules.count_ab, -getattr(rules, measure)))]
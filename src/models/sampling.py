@@ -0,0 +1,258 @@
+"""
+.. module:: sampling.py
+    :synopsis: Approximate frequent itemsets mined from a sample of baskets.
+
+"""
+
+import numpy as np
+from scipy.special import ndtri
+
+from src.data.transactions import Transactions, iter_transactions
+from src.models.bitsets import count_itemsets
+from src.models.itemsets import (
+    FrequentItemsets,
+    _apriori_candidates,
+    absolute_support,
+    frequent_itemsets,
+)
+from src.models.rules import generate_rules
+
+
+def sample_size(min_support, epsilon=0.2, delta=0.05):
+    """ Returns the number of sampled transactions after which the support
+        of an itemset of support at least ``min_support`` is off by more
+        than the fraction ``epsilon`` with probability at most ``delta``.
+
+    This is the Chernoff bound ``3 ln(2 / delta) / (epsilon^2 min_support)``
+    used by Toivonen's sampling algorithm.
+    """
+    return int(np.ceil(3 * np.log(2 / delta) / (epsilon ** 2 * min_support)))
+
+
+def sample_transactions(transactions, size, seed=None):
+    """ Returns ``size`` transactions drawn without replacement, in their
+        original order.
+    """
+    random = np.random.RandomState(seed)
+    if size >= transactions.n_transactions:
+        return transactions
+    rows = random.choice(transactions.n_transactions, size, replace=False)
+    return transactions.take(np.sort(rows))
+
+
+def reservoir_sample(chunks, size, seed=None):
+    """ Draws ``size`` transactions uniformly from a stream of
+        :class:`src.data.transactions.Transactions` chunks, like those of
+        :func:`src.data.transactions.iter_transactions`, in one pass.
+
+    Returns the sample and the number of transactions in the stream.
+    Transaction ``t`` of the stream replaces a random slot of the
+    reservoir with probability ``size / (t + 1)``, drawn for a whole chunk
+    at once, so only the reservoir is kept in memory.
+    """
+    random = np.random.RandomState(seed)
+    slots = [None] * size
+    seen = 0
+    labels = []
+    for chunk in chunks:
+        labels = chunk.labels
+        positions = seen + np.arange(chunk.n_transactions, dtype=np.int64)
+        targets = positions.copy()
+        late = positions >= size
+        targets[late] = (
+            random.random_sample(late.sum()) * (positions[late] + 1)
+        ).astype(np.int64)
+        # the last transaction drawn to a slot is the one left in it
+        rows = np.flatnonzero(targets < size)[::-1]
+        _, last = np.unique(targets[rows], return_index=True)
+        for row in rows[last].tolist():
+            # copied so that the chunk itself is not kept alive
+            basket = chunk.indices[chunk.indptr[row] : chunk.indptr[row + 1]]
+            slots[targets[row]] = basket.copy()
+        seen += chunk.n_transactions
+
+    baskets = slots[: min(seen, size)]
+    sizes = np.array([len(basket) for basket in baskets], dtype=np.int64)
+    indices = np.concatenate(baskets) if baskets else np.zeros(0, dtype=np.int32)
+    return Transactions(np.r_[0, np.cumsum(sizes)], indices, labels), seen
+
+
+def _wilson(counts, n, delta):
+    """ Returns the lower and upper ends of the Wilson score interval of
+        the proportions ``counts / n`` at confidence ``1 - delta``.
+    """
+    z = ndtri(1 - delta / 2)
+    p = np.asarray(counts, dtype=np.float64) / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+
+class SampledItemsets(FrequentItemsets):
+    """ Frequent itemsets counted on a sample of ``n_transactions`` out of
+        ``population`` transactions.
+
+    The itemsets are mined at a support lowered from ``min_support`` by the
+    fraction ``epsilon``, so that itemsets frequent in all transactions are
+    missed only with probability ``delta``. Supports and lifts come with
+    confidence intervals at level ``1 - delta`` and :meth:`verify` counts
+    the itemsets exactly in a second pass.
+    """
+
+    def __init__(
+        self,
+        counts,
+        n_transactions,
+        labels,
+        population,
+        min_support,
+        epsilon,
+        delta,
+        max_len=None,
+    ):
+        super().__init__(counts, n_transactions, labels)
+        self.population = population
+        self.min_support = min_support
+        self.epsilon = epsilon
+        self.delta = delta
+        self.max_len = max_len
+
+    def __repr__(self):
+        return "<SampledItemsets: {} itemsets from {} of {} transactions>".format(
+            len(self), self.n_transactions, self.population
+        )
+
+    def support_intervals(self):
+        """ Returns the lower and upper ends of the confidence intervals of
+            the supports of the itemsets.
+        """
+        counts = np.fromiter(self.counts.values(), dtype=np.int64, count=len(self))
+        return _wilson(counts, self.n_transactions, self.delta)
+
+    def to_frame(self):
+        """ Returns the itemsets as a data frame sorted by support, with the
+            confidence intervals of the supports.
+        """
+        data = super().to_frame()
+        lower, upper = _wilson(data["count"], self.n_transactions, self.delta)
+        data["support_lower"] = lower
+        data["support_upper"] = upper
+        return data
+
+    def rules(self, min_confidence=0.5, min_len=2, max_len=None):
+        """ Returns the rules of the sampled itemsets as a data frame like
+            :meth:`src.models.rules.RuleTable.to_frame`, with confidence
+            intervals of the lifts.
+
+        The intervals of the three supports of a rule are taken at
+        ``delta / 3`` each and the lift interval is their worst case, so it
+        holds with probability at least ``1 - delta``.
+        """
+        rules = generate_rules(self, min_confidence, min_len, max_len)
+        n, delta = self.n_transactions, self.delta / 3
+        low_a, high_a = _wilson(rules.count_a, n, delta)
+        low_b, high_b = _wilson(rules.count_b, n, delta)
+        low_ab, high_ab = _wilson(rules.count_ab, n, delta)
+        data = rules.to_frame()
+        with np.errstate(divide="ignore"):
+            data["lift_lower"] = low_ab / (high_a * high_b)
+            data["lift_upper"] = high_ab / (low_a * low_b)
+        return data
+
+    def negative_border(self):
+        """ Returns the itemsets that are not frequent in the sample but whose
+            every subset one item shorter is.
+        """
+        frequent_items = {itemset[0] for itemset in self.itemsets(1)}
+        border = [
+            (item,) for item in range(len(self.labels)) if item not in frequent_items
+        ]
+        length = 1
+        level = sorted(self.itemsets(1))
+        while level and (self.max_len is None or length < self.max_len):
+            longer = set(self.itemsets(length + 1))
+            border.extend(c for c in _apriori_candidates(level) if c not in longer)
+            level = sorted(longer)
+            length += 1
+        return border
+
+    def verify(self, source, chunksize=100000, sep=",", header=True):
+        """ Counts the sampled itemsets and their negative border exactly in
+            ``source``, the transactions or the basket file they were
+            sampled from, streamed in chunks.
+
+        Returns the :class:`src.models.itemsets.FrequentItemsets` of
+        ``source`` at ``min_support`` and whether they are complete: when
+        an itemset of the negative border is frequent, itemsets beyond it
+        may be missing and the sample should be mined again at a lower
+        support.
+        """
+        candidates = list(self.counts) + self.negative_border()
+        counts = np.zeros(len(candidates), dtype=np.int64)
+        if isinstance(source, Transactions):
+            chunks = [source]
+        else:
+            vocabulary = {label: i for i, label in enumerate(self.labels)}
+            chunks = iter_transactions(source, chunksize, sep, header, vocabulary)
+        n_transactions = 0
+        for chunk in chunks:
+            counts += count_itemsets(chunk, candidates)
+            n_transactions += chunk.n_transactions
+
+        min_count = absolute_support(self.min_support, n_transactions)
+        frequent = FrequentItemsets(
+            {
+                itemset: int(count)
+                for itemset, count in zip(candidates[: len(self)], counts.tolist())
+                if count >= min_count
+            },
+            n_transactions,
+            self.labels,
+        )
+        complete = not (counts[len(self) :] >= min_count).any()
+        return frequent, complete
+
+
+def sampled_itemsets(
+    source,
+    min_support=0.01,
+    epsilon=0.2,
+    delta=0.05,
+    size=None,
+    max_len=None,
+    method="eclat",
+    seed=None,
+    chunksize=100000,
+    sep=",",
+    header=True,
+):
+    """ Mines approximate frequent itemsets from a sample of ``source``,
+        transactions or a basket file streamed in chunks.
+
+    The sample has :func:`sample_size` transactions unless ``size`` is
+    given, like ``sample(data_trans, 10000)`` in R, and is mined at the
+    lowered support ``(1 - epsilon) * min_support``. Use
+    :meth:`SampledItemsets.verify` for exact counts.
+    """
+    if size is None:
+        size = sample_size(min_support, epsilon, delta)
+    if isinstance(source, Transactions):
+        sample = sample_transactions(source, size, seed)
+        population = source.n_transactions
+    else:
+        chunks = iter_transactions(source, chunksize, sep, header)
+        sample, population = reservoir_sample(chunks, size, seed)
+
+    mined = frequent_itemsets(
+        sample, (1 - epsilon) * min_support, max_len=max_len, method=method
+    )
+    return SampledItemsets(
+        mined.counts,
+        sample.n_transactions,
+        sample.labels,
+        population,
+        min_support,
+        epsilon,
+        delta,
+        max_len,
+    )
@@ -0,0 +1,265 @@
+"""
+.. module:: serve.py
+    :synopsis: HTTP service for recommendations from a rule store.
+
+"""
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import click
+
+from src.models.recommender import Recommender
+from src.models.store import current_version
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Server Error"}
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        "HTTP/1.1 {} {}\r\n"
+        "Content-Type: application/json\r\n"
+        "Content-Length: {}\r\n"
+        "Connection: {}\r\n\r\n"
+    ).format(
+        status, _REASONS[status], len(body), "keep-alive" if keep_alive else "close"
+    )
+    return head.encode("latin-1") + body
+
+
+class RecommendationService:
+    """ Serves ``POST /recommend`` with a JSON body like
+        ``{"basket": ["APP1190", "APP0698"], "n": 5}`` and
+        ``GET /recommend?basket=APP1190,APP0698&n=5``.
+
+    Requests that arrive together are collected for up to ``max_delay``
+    seconds, or until ``max_batch`` of them are waiting, and answered
+    with one :meth:`src.models.recommender.Recommender.recommend_batch`
+    call. ``POST /reload`` and a changed store on disk load a new
+    recommender in the background and swap it in at once. Batches that
+    already started finish with the recommender they started with, so
+    no request is dropped. ``GET /health`` tells the number of rules
+    served.
+    """
+
+    def __init__(self, store_directory, max_batch=64, max_delay=0.002, **options):
+        self.store_directory = Path(store_directory)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.options = options
+        self.recommender = Recommender.from_store(self.store_directory, **options)
+        self._stamp = self._store_stamp()
+        self._queue = None
+        self._reloading = None
+
+    def _store_stamp(self):
+        try:
+            return current_version(self.store_directory)
+        except OSError:
+            return None
+
+    async def reload(self):
+        """ Loads the store again and swaps the new recommender in.
+        """
+        if self._reloading is None:
+            self._reloading = asyncio.ensure_future(self._reload())
+        try:
+            return await asyncio.shield(self._reloading)
+        finally:
+            self._reloading = None
+
+    async def _reload(self):
+        loop = asyncio.get_event_loop()
+        stamp = self._store_stamp()
+        recommender = await loop.run_in_executor(
+            None, lambda: Recommender.from_store(self.store_directory, **self.options),
+        )
+        self.recommender = recommender
+        self._stamp = stamp
+        logger.info("serving %s", recommender)
+        return recommender
+
+    async def watch(self, interval=5.0):
+        """ Reloads the store whenever it is written again.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            stamp = self._store_stamp()
+            if stamp is not None and stamp != self._stamp:
+                try:
+                    await self.reload()
+                except Exception:  # a store being written is tried again
+                    logger.exception("could not reload %s", self.store_directory)
+
+    async def recommend(self, basket, n=10):
+        """ Queues a basket for the next batch and waits for its
+            recommendations.
+        """
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put((basket, n, future))
+        return await future
+
+    async def _batches(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            recommender = self.recommender
+            try:
+                n = max(n for _, n, _ in batch)
+                results = recommender.recommend_batch([b for b, _, _ in batch], n)
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, n, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result[:n])
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health" and method == "GET":
+            return 200, {"status": "ok", "rules": len(self.recommender)}
+        if url.path == "/reload" and method == "POST":
+            recommender = await self.reload()
+            return 200, {"status": "reloaded", "rules": len(recommender)}
+        if url.path != "/recommend":
+            return 404, {"error": "not found"}
+
+        if method == "GET":
+            query = parse_qs(url.query)
+            basket = [
+                sku for value in query.get("basket", []) for sku in value.split(",")
+            ]
+            n = int(query.get("n", ["10"])[0])
+        elif method == "POST":
+            request = json.loads(body.decode("utf-8") or "{}")
+            if not isinstance(request, dict):
+                return 400, {"error": "the body must be a JSON object"}
+            basket = request.get("basket", [])
+            n = int(request.get("n", 10))
+        else:
+            return 404, {"error": "not found"}
+        if not isinstance(basket, list) or n < 0:
+            return 400, {"error": "basket must be a list and n non-negative"}
+
+        recommendations = await self.recommend([str(sku) for sku in basket], n)
+        return (
+            200,
+            {
+                "basket": basket,
+                "recommendations": [
+                    {"sku": sku, "score": score} for sku, score in recommendations
+                ],
+            },
+        )
+
+    async def handle(self, reader, writer):
+        """ Answers the HTTP/1.1 requests of one connection.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                if len(parts) != 3 or not length.isdigit():
+                    # the end of a malformed request is not known, so the
+                    # connection cannot be used for another one
+                    writer.write(_response(400, {"error": "malformed request"}, False))
+                    await writer.drain()
+                    break
+                method, target, _ = parts
+                body = await reader.readexactly(int(length))
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                try:
+                    status, payload = await self._route(method, target, body)
+                except (ValueError, KeyError, TypeError) as error:
+                    status, payload = 400, {"error": str(error)}
+                except Exception as error:
+                    logger.exception("request failed")
+                    status, payload = 500, {"error": str(error)}
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080, reload_interval=5.0):
+        """ Starts serving and returns the :class:`asyncio.AbstractServer`.
+        """
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._batches())]
+        if reload_interval:
+            self._tasks.append(asyncio.ensure_future(self.watch(reload_interval)))
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def stop(self, server):
+        server.close()
+        await server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+
+
+@click.command()
+@click.argument("store_directory", type=click.Path(exists=True))
+@click.option("--host", default="127.0.0.1", help="Address to listen on.")
+@click.option("--port", default=8080, help="Port to listen on.")
+@click.option("--max-batch", default=64, help="Most requests answered at once.")
+@click.option(
+    "--max-delay", default=0.002, help="Seconds a request waits for its batch."
+)
+@click.option(
+    "--reload-interval",
+    default=5.0,
+    help="Seconds between checks for a new store, 0 to disable.",
+)
+def main(store_directory, host, port, max_batch, max_delay, reload_interval):
+    """ Serves recommendations from the rule store in STORE_DIRECTORY.
+    """
+    logger = logging.getLogger(__name__)
+    service = RecommendationService(store_directory, max_batch, max_delay)
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(service.start(host, port, reload_interval))
+    logger.info("serving %s on %s:%s", service.recommender, host, port)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(service.stop(server))
+
+
+if __name__ == "__main__":
+    log_fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    main()
@@ -0,0 +1,243 @@
+"""
+.. module:: store.py
+    :synopsis: Rules and itemsets stored as memory mapped NumPy arrays.
+
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from src.models.rules import RuleTable
+
+_HASH_SEED = np.uint64(0x9E3779B97F4A7C15)
+_HASH_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+
+# the file that names the published version of a store
+_CURRENT = "CURRENT"
+
+_ARRAYS = (
+    "labels",
+    "label_order",
+    "itemset_indptr",
+    "itemset_items",
+    "itemset_counts",
+    "antecedent",
+    "consequent",
+    "count_a",
+    "count_b",
+    "count_ab",
+    "antecedent_hash",
+)
+
+
+def _hash_itemsets(indptr, items):
+    """ Returns a 64 bit hash of every itemset of the CSR arrays
+        ``indptr`` and ``items``, whose items are sorted.
+    """
+    lengths = np.diff(indptr)
+    hashes = np.full(len(lengths), _HASH_SEED, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(int(lengths.max()) if len(lengths) else 0):
+            has_item = lengths > k
+            item = items[indptr[:-1][has_item] + k].astype(np.uint64) + np.uint64(1)
+            mixed = (hashes[has_item] ^ item) * _HASH_MULTIPLIER
+            hashes[has_item] = mixed ^ (mixed >> np.uint64(31))
+    return hashes
+
+
+def _versions(directory):
+    """ Returns the numbers of the version directories of a store.
+    """
+    return sorted(
+        int(path.name[1:])
+        for path in directory.glob("v*")
+        if path.is_dir() and path.name[1:].isdigit()
+    )
+
+
+def current_version(directory):
+    """ Returns the published version directory of the store in
+        ``directory``, ``None`` if nothing is published there.
+    """
+    directory = Path(directory)
+    try:
+        with open(str(directory / _CURRENT)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return directory / name
+
+
+class StoredItemsets:
+    """ Read only sequence of the itemsets of a store, read from the CSR
+        arrays on access.
+    """
+
+    def __init__(self, indptr, items):
+        self.indptr = indptr
+        self.items = items
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, k):
+        return tuple(self.items[self.indptr[k] : self.indptr[k + 1]].tolist())
+
+
+def write_store(rules, directory, frequent=None):
+    """ Writes ``rules`` to ``directory`` as ``.npy`` files that
+        :class:`RuleStore` maps into memory.
+
+    The rules are sorted by a hash of their antecedent, which is the index
+    from antecedents to their consequents. The support counts of the
+    itemsets are stored too when the :class:`FrequentItemsets`
+    ``frequent`` the rules were generated from are given.
+
+    Every write goes to a new version directory ``directory/v<N>``, which
+    is published by replacing the ``CURRENT`` file that names it, so a
+    reader always opens either the old or the new store in full. The
+    versions before the one that was replaced are deleted after the
+    swap, the replaced one is kept for readers that are still opening
+    it.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    versions = _versions(directory)
+    number = max(versions, default=0) + 1
+    version = directory / "v{}".format(number)
+    version.mkdir()
+
+    itemsets = [tuple(itemset) for itemset in rules.itemsets]
+    lengths = np.array([len(itemset) for itemset in itemsets], dtype=np.int64)
+    itemset_indptr = np.r_[0, np.cumsum(lengths)].astype(np.int64)
+    itemset_items = np.array(
+        [item for itemset in itemsets for item in itemset], dtype=np.int32
+    )
+    if frequent is None:
+        itemset_counts = np.full(len(itemsets), -1, dtype=np.int64)
+    else:
+        itemset_counts = np.array(
+            [frequent.counts.get(itemset, -1) for itemset in itemsets], dtype=np.int64
+        )
+
+    hashes = _hash_itemsets(itemset_indptr, itemset_items)[rules.antecedent]
+    order = np.argsort(hashes, kind="mergesort")
+    labels = np.asarray(rules.labels).astype(str)
+    arrays = {
+        "labels": labels,
+        "label_order": np.argsort(labels, kind="mergesort"),
+        "itemset_indptr": itemset_indptr,
+        "itemset_items": itemset_items,
+        "itemset_counts": itemset_counts,
+        "antecedent": rules.antecedent[order],
+        "consequent": rules.consequent[order],
+        "count_a": rules.count_a[order],
+        "count_b": rules.count_b[order],
+        "count_ab": rules.count_ab[order],
+        "antecedent_hash": hashes[order],
+    }
+    for name, array in arrays.items():
+        np.save(str(version / (name + ".npy")), array)
+    with open(str(version / "meta.json"), "w") as f:
+        json.dump({"n_transactions": int(rules.n_transactions)}, f)
+
+    previous = current_version(directory)
+    pointer = directory / (_CURRENT + ".tmp")
+    with open(str(pointer), "w") as f:
+        f.write(version.name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(str(pointer), str(directory / _CURRENT))
+
+    for old in versions:
+        old = directory / "v{}".format(old)
+        if old != previous:
+            shutil.rmtree(str(old), ignore_errors=True)
+
+
+class RuleStore:
+    """ The published version of the rules written with :func:`write_store`,
+        opened without reading them.
+
+    Every array is a read only memory map, so opening a store takes the
+    same time whatever its size, only the pages that a lookup touches
+    are read and processes that open the same store share those pages
+    through the page cache.
+    """
+
+    def __init__(self, directory):
+        self.directory = current_version(directory)
+        if self.directory is None:
+            raise FileNotFoundError("no rule store in {}".format(directory))
+        with open(self.directory / "meta.json") as f:
+            self.n_transactions = json.load(f)["n_transactions"]
+        for name in _ARRAYS:
+            path = str(self.directory / (name + ".npy"))
+            try:
+                setattr(self, name, np.load(path, mmap_mode="r"))
+            except ValueError:  # older numpy cannot map empty arrays
+                setattr(self, name, np.load(path))
+        self.itemsets = StoredItemsets(self.itemset_indptr, self.itemset_items)
+
+    def __len__(self):
+        return len(self.antecedent)
+
+    def __repr__(self):
+        return "<RuleStore: {} rules in {}>".format(len(self), self.directory)
+
+    def item_ids(self, skus):
+        """ Returns the item ids of ``skus``, -1 for unknown skus.
+        """
+        skus = np.asarray(list(skus)).astype(str)
+        positions = np.searchsorted(self.labels, skus, sorter=self.label_order)
+        positions = np.minimum(positions, len(self.labels) - 1)
+        ids = np.asarray(self.label_order[positions], dtype=np.int64)
+        ids[self.labels[ids] != skus] = -1
+        return ids
+
+    def _table(self, selection):
+        return RuleTable(
+            self.itemsets,
+            self.antecedent[selection],
+            self.consequent[selection],
+            self.count_a[selection],
+            self.count_b[selection],
+            self.count_ab[selection],
+            self.n_transactions,
+            self.labels,
+        )
+
+    def rules(self):
+        """ Returns all rules as a :class:`src.models.rules.RuleTable`.
+        """
+        return self._table(slice(None))
+
+    def consequents(self, antecedent):
+        """ Returns the rules whose antecedent is exactly the skus
+            ``antecedent``.
+        """
+        ids = self.item_ids(antecedent)
+        if not len(ids) or (ids < 0).any():
+            return self._table(slice(0, 0))
+        items = np.unique(ids)
+        key = _hash_itemsets(np.array([0, len(items)]), items)[0]
+        start = np.searchsorted(self.antecedent_hash, key, side="left")
+        stop = np.searchsorted(self.antecedent_hash, key, side="right")
+        # rules of other antecedents with the same hash are dropped
+        query = tuple(items.tolist())
+        matches = [
+            k
+            for k in range(start, stop)
+            if self.itemsets[int(self.antecedent[k])] == query
+        ]
+        return self._table(np.array(matches, dtype=np.int64))
+
+
+def open_store(directory):
+    """ Opens the rule store in ``directory``.
+    """
+    return RuleStore(directory)
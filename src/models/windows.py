@@ -0,0 +1,199 @@
+"""
+.. module:: windows.py
+    :synopsis: Frequent itemsets of rolling time windows.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.data.transactions import transactions_from_baskets
+from src.models.bitsets import popcount, vertical_bitsets
+from src.models.itemsets import FrequentItemsets, _apriori_candidates, absolute_support
+from src.models.cooccurrence import cooccurrence
+from src.models.rules import generate_rules
+
+# candidates counted at once
+_BLOCK_SIZE = 4096
+
+
+def _prefix_counts(bitsets, bounds):
+    """ Returns the number of set bits below every transaction id in
+        ``bounds`` for every row of ``bitsets``.
+    """
+    padded = np.zeros((len(bitsets), bitsets.shape[1] + 1), dtype=np.uint64)
+    padded[:, :-1] = bitsets
+    before = np.zeros((len(bitsets), padded.shape[1] + 1), dtype=np.int64)
+    np.cumsum(popcount(padded[:, :, None]), axis=1, out=before[:, 1:])
+
+    # the bits of the word that holds the bound that lie below it
+    words = bounds >> 6
+    masks = (np.uint64(1) << (bounds & 63).astype(np.uint64)) - np.uint64(1)
+    return before[:, words] + popcount((padded[:, words] & masks)[:, :, None])
+
+
+class WindowedItemsets:
+    """ Counts of itemsets in rolling windows of days.
+
+    Window ``w`` holds the transactions created on the ``window`` days
+    that end on ``ends[w]``. ``counts[k, w]`` is the number of
+    transactions of window ``w`` that contain ``itemsets[k]``, and every
+    itemset is frequent in at least one window.
+    """
+
+    def __init__(
+        self, itemsets, counts, ends, n_transactions, window, min_support, labels
+    ):
+        self.itemsets = itemsets
+        self.counts = counts
+        self.ends = ends
+        self.n_transactions = n_transactions
+        self.window = window
+        self.min_support = min_support
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __repr__(self):
+        return "<WindowedItemsets: {} windows of {} days, {} itemsets>".format(
+            len(self), self.window, len(self.itemsets)
+        )
+
+    def _position(self, window):
+        if isinstance(window, (int, np.integer)):
+            return window
+        return int(np.searchsorted(self.ends, np.datetime64(window, "D")))
+
+    def frequent(self, window):
+        """ Returns the frequent itemsets of a window given by its position
+            or its last day.
+        """
+        w = self._position(window)
+        n_transactions = int(self.n_transactions[w])
+        min_count = absolute_support(self.min_support, n_transactions)
+        kept = np.flatnonzero(self.counts[:, w] >= min_count)
+        counts = {self.itemsets[k]: int(self.counts[k, w]) for k in kept}
+        return FrequentItemsets(counts, n_transactions, self.labels)
+
+    def rules(self, window, min_confidence=0.5, min_len=2, max_len=None):
+        """ Returns the rules of a window, see
+            :func:`src.models.rules.generate_rules`.
+        """
+        return generate_rules(self.frequent(window), min_confidence, min_len, max_len)
+
+
+def windowed_itemsets(
+    transactions, dates, window=30, step=1, min_support=0.01, max_len=None
+):
+    """ Mines the frequent itemsets of every ``window`` day period ending
+        ``step`` days apart, from the creation ``dates`` of the
+        transactions.
+
+    The transactions are sorted by date, so every window is a range of
+    transaction ids. Candidates are counted level by level on bitset
+    tid-lists, and the count of a candidate in every window is the
+    difference of two prefix counts, which slides the window by adding
+    the days that enter it and subtracting the days that leave it
+    instead of mining every window again. A candidate is counted only if
+    all of its subsets are frequent in a common window.
+    """
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]")
+    order = np.argsort(days, kind="mergesort")
+    days = days[order]
+    transactions = transactions.take(order)
+
+    window_delta = np.timedelta64(window - 1, "D")
+    ends = np.arange(
+        days[0] + window_delta,
+        days[-1] + np.timedelta64(1, "D"),
+        np.timedelta64(step, "D"),
+    )
+    if not len(ends):
+        ends = np.array([days[-1]])
+    starts = np.searchsorted(days, ends - window_delta, side="left")
+    stops = np.searchsorted(days, ends, side="right")
+    n_transactions = stops - starts
+    min_counts = np.array(
+        [absolute_support(min_support, n) for n in n_transactions.tolist()]
+    )
+
+    def window_counts(candidates):
+        counts = np.empty((len(candidates), len(ends)), dtype=np.int64)
+        for start in range(0, len(candidates), _BLOCK_SIZE):
+            block = candidates[start : start + _BLOCK_SIZE]
+            joint = item_bitsets[block[:, 0]]
+            for k in range(1, block.shape[1]):
+                joint = joint & item_bitsets[block[:, k]]
+            prefix = _prefix_counts(joint, np.r_[starts, stops])
+            counts[start : start + len(block)] = (
+                prefix[:, len(starts) :] - prefix[:, : len(starts)]
+            )
+        return counts
+
+    itemsets = []
+    counts = []
+
+    item_bitsets = vertical_bitsets(transactions)
+    item_counts = window_counts(np.arange(transactions.n_items).reshape(-1, 1))
+    frequent = item_counts >= min_counts
+    items = np.flatnonzero(frequent.any(axis=1))
+    level = [(int(item),) for item in items]
+    masks = dict(zip(level, frequent[items]))
+    itemsets.extend(level)
+    counts.append(item_counts[items])
+
+    # pairs that never occur together cannot be frequent in any window
+    pairs = cooccurrence(transactions, dense=False).tocoo()
+    is_item = np.zeros(transactions.n_items, dtype=bool)
+    is_item[items] = True
+    keep = (
+        (pairs.row < pairs.col)
+        & is_item[pairs.row]
+        & is_item[pairs.col]
+        & (pairs.data >= min_counts.min())
+    )
+    candidates = np.column_stack([pairs.row[keep], pairs.col[keep]]).astype(np.int64)
+    candidates = candidates[np.lexsort((candidates[:, 1], candidates[:, 0]))]
+
+    length = 2
+    while len(candidates) and (max_len is None or length <= max_len):
+        # a candidate can only be frequent where all of its subsets are
+        shared = np.ones((len(candidates), len(ends)), dtype=bool)
+        for k in range(length):
+            subsets = np.delete(candidates, k, axis=1)
+            shared &= np.array([masks[tuple(row)] for row in subsets.tolist()])
+        candidates = candidates[shared.any(axis=1)]
+        shared = shared[shared.any(axis=1)]
+
+        candidate_counts = window_counts(candidates)
+        frequent = (candidate_counts >= min_counts) & shared
+        kept = frequent.any(axis=1)
+
+        level = [tuple(row) for row in candidates[kept].tolist()]
+        masks = dict(zip(level, frequent[kept]))
+        itemsets.extend(level)
+        counts.append(candidate_counts[kept])
+        candidates = np.array(_apriori_candidates(level), dtype=np.int64)
+        candidates = candidates.reshape(-1, length + 1)
+        length += 1
+
+    return WindowedItemsets(
+        itemsets,
+        np.concatenate(counts).astype(np.int32),
+        ends,
+        n_transactions,
+        window,
+        min_support,
+        transactions.labels,
+    )
+
+
+def windowed_itemsets_from_frame(data_trans_enriched, **options):
+    """ Mines the windows of the ``items`` and ``created_date`` columns of
+        the enriched transactions, see :func:`windowed_itemsets`.
+    """
+    transactions = transactions_from_baskets(data_trans_enriched["items"])
+    return windowed_itemsets(
+        transactions, data_trans_enriched["created_date"], **options
+    )
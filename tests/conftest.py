@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.data.transactions import transactions_from_baskets
+from src.models.itemsets import frequent_itemsets
+from src.models.rules import generate_rules
+
+
+@pytest.fixture
+def random_baskets():
+    """ Returns a function that draws ``n_baskets`` baskets of 1 to
+        ``max_size`` skus out of ``n_skus``, with the popularity
+        ``weights`` of the skus when given.
+    """
+
+    def draw(n_baskets, n_skus=20, max_size=4, weights=None, rng=None):
+        rng = np.random.RandomState(0) if rng is None else rng
+        skus = np.array(["SKU{:02d}".format(i) for i in range(n_skus)], dtype=object)
+        if weights is not None:
+            weights = weights / weights.sum()
+        return [
+            rng.choice(skus, size=rng.randint(1, max_size + 1), p=weights)
+            for _ in range(n_baskets)
+        ]
+
+    return draw
+
+
+@pytest.fixture
+def random_transactions(random_baskets):
+    """ Returns a function that draws transactions like
+        ``random_baskets``.
+    """
+
+    def draw(n_baskets, **options):
+        return transactions_from_baskets(random_baskets(n_baskets, **options))
+
+    return draw
+
+
+@pytest.fixture
+def rules(random_transactions):
+    """ The rules of 300 random baskets and the frequent itemsets they
+        were generated from.
+    """
+    frequent = frequent_itemsets(random_transactions(300), 0.01, method="fpgrowth")
+    return generate_rules(frequent, min_confidence=0.1), frequent
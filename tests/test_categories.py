@@ -0,0 +1,41 @@
+import pandas as pd
+
+from src.data import categories
+from src.data.cache import StageCache
+
+
+def test_pages_are_read_in_ranges_and_cached_by_page(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "categories.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4\n1 0 obj << /Type /Pages /Count 10 >> endobj\n")
+    calls = []
+
+    def read_pages(path, first, last):
+        calls.append((first, last))
+        return [
+            pd.DataFrame({"labels": ["SKU{}".format(page)], "level1": ["smartwhatch"]})
+            for page in range(first, last + 1)
+        ]
+
+    monkeypatch.setattr(categories, "read_pages", read_pages)
+
+    data_categories, _ = categories.extract_categories(
+        pdf_path, StageCache(tmp_path / "cache"), n_jobs=3
+    )
+    assert data_categories().labels.tolist() == [
+        "SKU{}".format(page) for page in range(1, 11)
+    ]
+    assert (data_categories().level1 == "smartwatch").all()
+    assert sorted(calls) == [(1, 4), (5, 7), (8, 10)]
+
+    # an interrupted run reads only the pages that are not cached, one range
+    # of consecutive pages at a time
+    for path in (tmp_path / "cache").glob("categories-*.parquet"):
+        path.unlink()
+    for page in (2, 3, 6):
+        next((tmp_path / "cache").glob("category_page_{}-*".format(page))).unlink()
+    calls.clear()
+    data_categories, _ = categories.extract_categories(
+        pdf_path, StageCache(tmp_path / "cache"), n_jobs=2
+    )
+    assert len(data_categories()) == 10
+    assert sorted(calls) == [(2, 3), (6, 6)]
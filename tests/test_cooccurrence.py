@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from src.models.cooccurrence import cooccurrence
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.float32])
+def test_dense_matches_sparse(random_transactions, dtype):
+    transactions = random_transactions(500, n_skus=30, max_size=5)
+
+    dense = cooccurrence(transactions, dtype=dtype, dense=True)
+    sparse = cooccurrence(transactions, block_size=7, dtype=dtype, dense=False)
+    assert isinstance(dense, np.ndarray)
+    assert dense.dtype == dtype
+    assert np.array_equal(dense, sparse.toarray())
+    assert np.array_equal(np.diag(dense), transactions.item_counts())
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src.data.transactions import transactions_from_baskets
+from src.models.incremental import IncrementalItemsets
+from src.models.itemsets import frequent_itemsets
+
+
+@pytest.fixture
+def batches(random_baskets):
+    rng = np.random.RandomState(0)
+    batches = []
+    for batch in range(12):
+        # the popular skus drift from batch to batch, so that itemsets keep
+        # crossing the border in both directions
+        weights = 1.0 / (1 + (np.arange(40) + 3 * batch) % 40)
+        batches.append(random_baskets(rng.randint(100, 300), 40, 5, weights, rng))
+    return batches
+
+
+def by_label(itemsets):
+    labels = itemsets.labels
+    return {
+        tuple(sorted(labels[i] for i in itemset)): count
+        for itemset, count in itemsets.counts.items()
+    }
+
+
+@pytest.mark.parametrize("max_len", [None, 2])
+def test_updates_match_full_mining(batches, tmp_path, max_len):
+    incremental = IncrementalItemsets.from_transactions(
+        transactions_from_baskets(batches[0]), 0.02, 0.015, max_len
+    )
+    loads = []
+    for k in range(1, len(batches)):
+        seen = [basket for batch in batches[:k] for basket in batch]
+
+        def history(seen=seen):
+            loads.append(len(seen))
+            return transactions_from_baskets(seen)
+
+        incremental.update(transactions_from_baskets(batches[k]), history)
+        if k == len(batches) // 2:
+            incremental.save(str(tmp_path / "itemsets.npz"))
+            incremental = IncrementalItemsets.load(str(tmp_path / "itemsets.npz"))
+
+        everything = transactions_from_baskets(seen + batches[k])
+        expected = frequent_itemsets(everything, 0.02, max_len, method="fpgrowth")
+        assert by_label(incremental.frequent()) == by_label(expected)
+
+    # the history is read only for the batches where an itemset crossed the
+    # border far enough to maybe be frequent
+    assert 0 < len(loads) < len(batches) - 1
+
+
+def test_border_support_above_min_support():
+    with pytest.raises(ValueError):
+        IncrementalItemsets({}, 0, {}, 0.01, 0.02)
@@ -0,0 +1,41 @@
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from src.data.transactions import transactions_from_baskets
+from src.models.itemsets import absolute_support, frequent_itemsets
+
+
+def brute_force(transactions, min_support, max_len):
+    """ Counts every itemset of every basket and keeps the frequent ones.
+    """
+    counts = Counter()
+    for basket in np.split(transactions.indices, transactions.indptr[1:-1]):
+        basket = sorted(basket.tolist())
+        for length in range(1, len(basket) + 1 if max_len is None else max_len + 1):
+            counts.update(combinations(basket, length))
+    min_count = absolute_support(min_support, transactions.n_transactions)
+    return {itemset: count for itemset, count in counts.items() if count >= min_count}
+
+
+@pytest.mark.parametrize(
+    "method, n_jobs", [("eclat", 1), ("fpgrowth", 1), ("apriori", 1), ("apriori", 2)],
+)
+@pytest.mark.parametrize("min_support, max_len", [(0.01, None), (0.03, 2)])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_miners_match_brute_force(
+    random_baskets, method, n_jobs, min_support, max_len, seed
+):
+    transactions = transactions_from_baskets(
+        random_baskets(300, n_skus=15, max_size=6, rng=np.random.RandomState(seed))
+    )
+    mined = frequent_itemsets(transactions, min_support, max_len, method, n_jobs)
+    assert mined.counts == brute_force(transactions, min_support, max_len)
+
+
+@pytest.mark.parametrize("method", ["eclat", "fpgrowth"])
+def test_only_apriori_runs_in_parallel(random_transactions, method):
+    with pytest.raises(ValueError):
+        frequent_itemsets(random_transactions(10), 0.1, method=method, n_jobs=2)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from src.data.quality import reconcile_prices
+
+
+def test_unpriced_items_are_flagged_apart_from_mismatches():
+    data_orders = pd.DataFrame(
+        {
+            "id_order": [1, 2, 3, 4],
+            "created_date": pd.to_datetime(["2017-01-01"] * 4),
+            "state": ["Completed"] * 4,
+            "total_paid": [5.0, 7.0, 9.0, 1.0],
+        }
+    )
+    data_items = pd.DataFrame(
+        {
+            "id_order": [1, 1, 2, 2, 3],
+            "unit_price": [2.0, 1.5, np.nan, 3.0, 8.0],
+            "product_quantity": [1, 2, 1, 1, 1],
+        }
+    )
+    data = reconcile_prices(data_orders, data_items)
+
+    assert data.price_matches.tolist() == [True, False, False, False]
+    assert data.unpriced_items.tolist() == [0, 1, 0, 0]
+    # the items that have a price are still summed
+    assert data.total_items_price.iloc[:3].tolist() == [5.0, 3.0, 8.0]
+    # an order without items has no items price
+    assert np.isnan(data.total_items_price.iloc[3])
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import quality_job
+from src.data.quality import reconcile_prices
+from src.data.quality_job import CHECK_COLUMNS, run_checks
+
+ORDERS_HEADER = "id_order;created_date;total_paid;state\n"
+
+ITEMS_HEADER = "id;id_order;product_id;product_quantity;sku;unit_price;date\n"
+
+
+def price(value):
+    return "" if np.isnan(value) else "{:.2f}".format(value).replace(".", ",")
+
+
+@pytest.fixture
+def lines():
+    """ Returns the lines of the orders and of the items, in the order they
+        are appended to the sources.
+    """
+    rng = np.random.RandomState(0)
+    days = pd.date_range("2017-01-01", periods=20, freq="D")
+    orders = []
+    items = []
+    for id_order in range(300):
+        # some ids are used twice, on other days
+        id_order = id_order if rng.rand() > 0.05 else rng.randint(id_order + 1)
+        day = rng.randint(len(days))
+        prices = np.round(rng.uniform(1, 50, rng.randint(0, 4)), 2)
+        if len(prices) and rng.rand() < 0.05:
+            prices[0] = np.nan
+        paid = np.nansum(prices) + (rng.rand() < 0.2) * rng.uniform(-5, 5)
+        state = "Completed" if rng.rand() < 0.7 else "Cancelled"
+        created = days[day] + pd.Timedelta(hours=rng.randint(24))
+        orders.append(
+            (day, "{};{};{};{}\n".format(id_order, created, price(paid), state))
+        )
+        for unit_price in prices:
+            # items come up to two days after their order, some with no
+            # order at all
+            item_day = min(day + rng.randint(3), len(days) - 1)
+            item_order = id_order if rng.rand() > 0.03 else 100000 + len(items)
+            item_id = len(items) if rng.rand() > 0.03 else rng.randint(len(items) + 1)
+            items.append(
+                (
+                    item_day,
+                    "{};{};1;1;SKU;{};{}\n".format(
+                        item_id, item_order, price(unit_price), days[item_day]
+                    ),
+                )
+            )
+    # appended in the order of the days they arrive on
+    orders = [line for _, line in sorted(orders, key=lambda pair: pair[0])]
+    items = [line for _, line in sorted(items, key=lambda pair: pair[0])]
+    return orders, items
+
+
+def expected_checks(orders_path, items_path):
+    """ The checks of every day computed from all the rows at once.
+    """
+    data_orders = quality_job.read_orders(orders_path)
+    data_items = quality_job.read_lineitems(items_path)
+    prices = reconcile_prices(data_orders, data_items)
+    completed = data_orders.state.astype(str) == "Completed"
+    checks_orders = pd.DataFrame(
+        {
+            "day": data_orders.created_date.dt.normalize(),
+            "n_orders": 1,
+            "null_total_paid": data_orders.total_paid.isna(),
+            "zero_total_paid": data_orders.total_paid == 0,
+            "duplicate_order_ids": data_orders.id_order.duplicated(keep=False),
+            "orders_without_items": ~data_orders.id_order.isin(data_items.id_order),
+            "completed_orders": completed,
+            "matching_completed_orders": completed & prices.price_matches,
+        }
+    )
+    checks_items = pd.DataFrame(
+        {
+            "day": data_items.date.dt.normalize(),
+            "n_items": 1,
+            "orphan_items": ~data_items.id_order.isin(data_orders.id_order),
+            "null_unit_price": data_items.unit_price.isna(),
+            "negative_unit_price": data_items.unit_price < 0,
+            "duplicate_item_ids": data_items.id.duplicated(keep=False),
+        }
+    )
+    data = (
+        checks_orders.groupby("day")
+        .sum()
+        .join(checks_items.groupby("day").sum(), how="outer")
+    )
+    return data.reindex(columns=CHECK_COLUMNS).fillna(0).astype(np.int64)
+
+
+def test_appended_rows_give_the_checks_of_all_rows(lines, tmp_path, monkeypatch):
+    orders, items = lines
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    orders_path = raw / "orders_translated.csv"
+    items_path = raw / "lineitems.csv"
+    orders_path.write_text(ORDERS_HEADER)
+    items_path.write_text(ITEMS_HEADER)
+    read_days = []
+    read_partitions = quality_job.read_partitions
+
+    def recorded(directory, column, keys, columns):
+        read_days.append(len(keys))
+        return read_partitions(directory, column, keys, columns)
+
+    monkeypatch.setattr(quality_job, "read_partitions", recorded)
+
+    for part in range(5):
+        with open(str(orders_path), "a") as f:
+            f.writelines(
+                orders[part * len(orders) // 5 : (part + 1) * len(orders) // 5]
+            )
+        with open(str(items_path), "a") as f:
+            f.writelines(items[part * len(items) // 5 : (part + 1) * len(items) // 5])
+        read_days.clear()
+        results = run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+
+        expected = expected_checks(orders_path, items_path)
+        assert results.day.tolist() == expected.index.tolist()
+        assert (results[CHECK_COLUMNS].to_numpy() == expected.to_numpy()).all()
+        if part:
+            # only the days that the new rows share an id with are read again
+            assert max(read_days) < len(expected)
+
+    # nothing new
+    assert run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet").equals(
+        results
+    )
+
+
+def test_changed_source_checks_every_day_again(lines, tmp_path):
+    orders, items = lines
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "orders_translated.csv").write_text(ORDERS_HEADER + "".join(orders))
+    (raw / "lineitems.csv").write_text(ITEMS_HEADER + "".join(items))
+    run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+
+    # the first orders are rewritten instead of appended to
+    (raw / "orders_translated.csv").write_text(ORDERS_HEADER + "".join(orders[50:]))
+    results = run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+    expected = expected_checks(raw / "orders_translated.csv", raw / "lineitems.csv")
+    assert results.day.tolist() == expected.index.tolist()
+    assert (results[CHECK_COLUMNS].to_numpy() == expected.to_numpy()).all()
+
+
+def test_edit_before_the_watermark_checks_every_day_again(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    orders = [
+        "{};2017-01-{:02d} 10:00:00;10,00;Cancelled\n".format(i, 1 + i % 28)
+        for i in range(3000)
+    ]
+    (raw / "orders_translated.csv").write_text(ORDERS_HEADER + "".join(orders))
+    (raw / "lineitems.csv").write_text(ITEMS_HEADER)
+    assert (raw / "orders_translated.csv").stat().st_size > 1 << 16
+    results = run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+    assert results.completed_orders.sum() == 0
+
+    # the first order changes in place, far before the end of the file
+    orders[0] = orders[0].replace("Cancelled", "Completed")
+    (raw / "orders_translated.csv").write_text(ORDERS_HEADER + "".join(orders))
+    results = run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+    assert results.completed_orders.sum() == 1
+
+
+def test_missing_checks_are_built_again(lines, tmp_path):
+    orders, items = lines
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "orders_translated.csv").write_text(ORDERS_HEADER + "".join(orders[:200]))
+    (raw / "lineitems.csv").write_text(ITEMS_HEADER + "".join(items))
+    run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+
+    # the checks are deleted while the state is kept, and a few orders arrive
+    (tmp_path / "checks.parquet").unlink()
+    with open(str(raw / "orders_translated.csv"), "a") as f:
+        f.writelines(orders[200:])
+    results = run_checks(raw, tmp_path / "state", tmp_path / "checks.parquet")
+    expected = expected_checks(raw / "orders_translated.csv", raw / "lineitems.csv")
+    assert results.day.tolist() == expected.index.tolist()
+    assert (results[CHECK_COLUMNS].to_numpy() == expected.to_numpy()).all()
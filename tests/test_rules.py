@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from src.models.itemsets import frequent_itemsets
+from src.models.rules import Appearance, generate_rules, mine_rules, top_k_rules
+
+
+@pytest.fixture
+def transactions(random_transactions):
+    # a skewed popularity so that some rules are much stronger than others
+    return random_transactions(
+        400, n_skus=30, max_size=6, weights=1.0 / np.arange(1, 31)
+    )
+
+
+def best_rules(rules, k, measure):
+    """ Returns the ``(measure, count_ab)`` pairs of the ``k`` best rules,
+        which do not depend on how ties between equal rules are broken.
+    """
+    values = getattr(rules, measure)
+    order = np.lexsort((-rules.count_ab, -values))[:k]
+    return values[order], rules.count_ab[order]
+
+
+def allowed(rules, appearance):
+    """ Returns the rules whose items may appear where they do.
+    """
+    rhs, lhs = appearance.item_masks(rules.labels)
+    mask = np.array(
+        [
+            rhs[rules.itemsets[c][0]] and all(lhs[i] for i in rules.itemsets[a])
+            for a, c in zip(rules.antecedent, rules.consequent)
+        ],
+        dtype=bool,
+    )
+    return rules[mask]
+
+
+def by_label(rules):
+    """ The rules as ``(antecedent skus, consequent sku) -> counts``.
+    """
+    labels = rules.labels
+    return {
+        (
+            frozenset(labels[i] for i in rules.itemsets[a]),
+            labels[rules.itemsets[c][0]],
+        ): (count_a, count_b, count_ab)
+        for a, c, count_a, count_b, count_ab in zip(
+            rules.antecedent.tolist(),
+            rules.consequent.tolist(),
+            rules.count_a.tolist(),
+            rules.count_b.tolist(),
+            rules.count_ab.tolist(),
+        )
+    }
+
+
+@pytest.mark.parametrize(
+    "appearance",
+    [
+        Appearance(lhs_exclude=["SKU00", "SKU03"]),
+        Appearance(rhs=["SKU00", "SKU01", "SKU05"]),
+        Appearance(rhs=["SKU00", "SKU01"], lhs_exclude=["SKU02"]),
+    ],
+    ids=["antecedents", "consequents", "both"],
+)
+@pytest.mark.parametrize("min_len, max_len", [(2, None), (3, None), (2, 2), (2, 3)])
+@pytest.mark.parametrize("method", ["eclat", "fpgrowth"])
+def test_mine_rules_with_appearance_match_filtered_rules(
+    transactions, appearance, min_len, max_len, method
+):
+    frequent = frequent_itemsets(transactions, 0.01, max_len, method=method)
+    rules = generate_rules(frequent, 0.1, min_len, max_len)
+    expected = allowed(rules, appearance)
+    assert 0 < len(expected) < len(rules)
+
+    mined = mine_rules(
+        transactions, 0.01, 0.1, min_len, max_len, appearance, method=method
+    )
+    assert by_label(mined) == by_label(expected)
+
+
+@pytest.mark.parametrize("measure", ["lift", "confidence"])
+@pytest.mark.parametrize("min_support", [0.0, 0.01])
+@pytest.mark.parametrize("max_len", [None, 2, 3])
+def test_top_k_rules_match_full_mining(transactions, measure, min_support, max_len):
+    frequent = frequent_itemsets(transactions, min_support, max_len, method="fpgrowth")
+    expected = generate_rules(frequent, min_confidence=0.0, max_len=max_len)
+
+    for k in (1, 10, 50):
+        rules = top_k_rules(transactions, k, measure, min_support, max_len)
+        values, counts = best_rules(expected, k, measure)
+        assert len(rules) == len(values)
+        assert np.allclose(getattr(rules, measure), values)
+        assert np.array_equal(rules.count_ab, counts)
+
+
+def test_top_k_rules_with_appearance(transactions):
+    appearance = Appearance(rhs=["SKU00", "SKU01"], lhs_exclude=["SKU02"])
+    frequent = frequent_itemsets(transactions, 0.0, method="fpgrowth")
+    expected = allowed(generate_rules(frequent, min_confidence=0.0), appearance)
+
+    rules = top_k_rules(transactions, 20, "lift", appearance=appearance)
+    values, counts = best_rules(expected, 20, "lift")
+    assert np.allclose(rules.lift, values)
+    assert np.array_equal(rules.count_ab, counts)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from src.data.transactions import read_transactions
+from src.models.itemsets import frequent_itemsets
+from src.models.sampling import SampledItemsets, reservoir_sample, sampled_itemsets
+
+
+def chunks_of(transactions, chunksize):
+    for start in range(0, transactions.n_transactions, chunksize):
+        stop = min(start + chunksize, transactions.n_transactions)
+        yield transactions.take(np.arange(start, stop))
+
+
+def reservoir_rows(n_transactions, size, seed):
+    """ The rows left in the reservoir by drawing one transaction at a
+        time.
+    """
+    random = np.random.RandomState(seed)
+    slots = []
+    for position in range(n_transactions):
+        if position < size:
+            slots.append(position)
+            continue
+        target = int(random.random_sample() * (position + 1))
+        if target < size:
+            slots[target] = position
+    return slots
+
+
+def baskets(transactions):
+    return [sorted(transactions.basket(t)) for t in range(len(transactions))]
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 50, 1000])
+@pytest.mark.parametrize("size", [20, 500])
+def test_reservoir_sample_draws_across_chunks(random_transactions, chunksize, size):
+    transactions = random_transactions(300)
+    sample, seen = reservoir_sample(chunks_of(transactions, chunksize), size, seed=3)
+
+    assert seen == 300
+    assert sample.n_transactions == min(size, 300)
+    rows = reservoir_rows(300, size, seed=3)
+    assert baskets(sample) == baskets(transactions.take(rows))
+
+
+def write_baskets(transactions, filepath):
+    lines = ["items"]
+    lines.extend(",".join(transactions.basket(t)) for t in range(len(transactions)))
+    filepath.write_text("\n".join(lines) + "\n")
+
+
+def test_verify_matches_full_mining(random_transactions, tmp_path):
+    # a skewed popularity keeps the supports away from the minimum support
+    transactions = random_transactions(
+        2000, n_skus=15, max_size=5, weights=1.0 / np.arange(1, 16)
+    )
+    expected = frequent_itemsets(transactions, 0.02).counts
+
+    sampled = sampled_itemsets(transactions, 0.02, size=1000, seed=0)
+    frequent, complete = sampled.verify(transactions)
+    assert complete
+    assert frequent.counts == expected
+
+    # streamed from a basket file, in chunks
+    write_baskets(transactions, tmp_path / "trans.csv")
+    read = read_transactions(tmp_path / "trans.csv")
+    sampled = sampled_itemsets(tmp_path / "trans.csv", 0.02, size=1000, chunksize=64)
+    assert sampled.population == 2000
+    frequent, complete = sampled.verify(tmp_path / "trans.csv", chunksize=64)
+    assert complete
+    assert frequent.counts == frequent_itemsets(read, 0.02).counts
+
+
+def test_frequent_negative_border_is_incomplete(random_transactions):
+    transactions = random_transactions(1000, n_skus=15, max_size=5)
+    # a sample without the most popular item misses it and its itemsets
+    popular = int(np.argmax(transactions.item_counts()))
+    with_popular = transactions.row_ids()[transactions.indices == popular]
+    rows = np.setdiff1d(np.arange(len(transactions)), with_popular)
+    sample = transactions.take(rows)
+    mined = frequent_itemsets(sample, 0.02)
+    sampled = SampledItemsets(
+        mined.counts,
+        sample.n_transactions,
+        sample.labels,
+        transactions.n_transactions,
+        0.02,
+        0.2,
+        0.05,
+    )
+    assert (popular,) in sampled.negative_border()
+
+    frequent, complete = sampled.verify(transactions)
+    assert not complete
+    assert (popular,) not in frequent
+    expected = frequent_itemsets(transactions, 0.02).counts
+    assert {
+        itemset: count for itemset, count in expected.items() if popular not in itemset
+    } == frequent.counts
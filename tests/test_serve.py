@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+from src.models.serve import RecommendationService
+from src.models.store import write_store
+
+
+@pytest.fixture
+def store(rules, tmp_path):
+    write_store(rules[0], tmp_path / "store")
+    return tmp_path / "store"
+
+
+async def send(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    return status, json.loads(body.decode("utf-8"))
+
+
+def post(basket, n):
+    body = json.dumps({"basket": basket, "n": n}).encode("utf-8")
+    head = "POST /recommend HTTP/1.1\r\nContent-Length: {}\r\n\r\n"
+    return head.format(len(body)).encode("latin-1") + body
+
+
+def serve(store, requests, **options):
+    """ Sends ``requests`` at once to a service of ``store`` and returns
+        the responses with the sizes of the batches that answered them.
+    """
+    service = RecommendationService(store, **options)
+    sizes = []
+    recommend_batch = service.recommender.recommend_batch
+
+    def counted(baskets, n):
+        sizes.append(len(baskets))
+        return recommend_batch(baskets, n)
+
+    service.recommender.recommend_batch = counted
+
+    async def run():
+        server = await service.start(port=0, reload_interval=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(*(send(port, r) for r in requests))
+        finally:
+            await service.stop(server)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run()), sizes, service
+    finally:
+        loop.close()
+
+
+def test_requests_are_answered_in_batches(store):
+    baskets = [["SKU00"], ["SKU01", "SKU02"], ["SKU03"], [], ["SKU00", "SKU04"]]
+    ns = [3, 5, 1, 2, 4]
+    responses, sizes, service = serve(
+        store, [post(b, n) for b, n in zip(baskets, ns)], max_delay=0.2
+    )
+
+    assert len(sizes) < len(baskets)
+    assert sum(sizes) == len(baskets)
+    for (status, payload), basket, n in zip(responses, baskets, ns):
+        assert status == 200
+        expected = service.recommender.recommend(basket, n)
+        assert [(r["sku"], r["score"]) for r in payload["recommendations"]] == [
+            (sku, pytest.approx(score)) for sku, score in expected
+        ]
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        b"GARBAGE\r\n\r\n",
+        b"POST /recommend HTTP/1.1\r\nContent-Length: x\r\n\r\n",
+        b'POST /recommend HTTP/1.1\r\nContent-Length: 9\r\n\r\n["SKU00"]',
+        b'POST /recommend HTTP/1.1\r\nContent-Length: 8\r\n\r\n{"n": []}',
+    ],
+)
+def test_malformed_requests_are_rejected(store, request_):
+    responses, sizes, _ = serve(store, [request_])
+    assert responses[0][0] == 400
+    assert not sizes
@@ -0,0 +1,27 @@
+import pytest
+
+from src.models.store import current_version, open_store, write_store
+
+
+def test_writes_publish_new_versions(rules, tmp_path):
+    rules, frequent = rules
+    directory = tmp_path / "store"
+    assert current_version(directory) is None
+    with pytest.raises(FileNotFoundError):
+        open_store(directory)
+
+    write_store(rules, directory, frequent)
+    first = open_store(directory)
+    assert first.directory == directory / "v1"
+    assert len(first) == len(rules)
+
+    write_store(rules[:10], directory)
+    assert current_version(directory) == directory / "v2"
+    assert len(open_store(directory)) == 10
+    # a store that is open keeps working while a new version is published
+    assert len(first.rules()) == len(rules)
+
+    write_store(rules[:5], directory)
+    # only the replaced version is kept next to the published one
+    assert sorted(p.name for p in directory.iterdir()) == ["CURRENT", "v2", "v3"]
+    assert len(open_store(directory)) == 5
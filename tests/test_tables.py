@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from src.data.tables import read_lineitems
+
+HEADER = "id;id_order;product_id;product_quantity;sku;unit_price;date\n"
+
+
+def test_read_lineitems_strips_skus(tmp_path):
+    filepath = tmp_path / "lineitems.csv"
+    filepath.write_text(
+        HEADER
+        + "1;10;1;1; APP1;1,5;2017-01-01 10:00:00\n"
+        + "2;10;2;2;APP1 ;2,5;2017-01-01 10:00:00\n"
+        + "3;11;3;1;;3,0;2017-01-02 11:00:00\n"
+    )
+    data_items = read_lineitems(filepath)
+    assert list(data_items.sku.cat.categories) == ["APP1"]
+    assert data_items.sku.isna().tolist() == [False, False, True]
+
+
+def test_read_lineitems_without_skus(tmp_path):
+    filepath = tmp_path / "lineitems.csv"
+    filepath.write_text(
+        HEADER
+        + "1;10;1;1;;1,5;2017-01-01 10:00:00\n"
+        + "2;11;2;1;;2,5;2017-01-02 10:00:00\n"
+    )
+    data_items = read_lineitems(filepath)
+    assert data_items.sku.isna().all()
+    assert len(data_items.sku.cat.categories) == 0
+    assert np.allclose(data_items.unit_price, [1.5, 2.5])
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.transactions import baskets_from_lineitems, read_transactions
+
+
+@pytest.fixture
+def data_items():
+    rng = np.random.RandomState(0)
+    skus = np.array(["SKU{:04d}".format(i) for i in range(50)], dtype=object)
+    return pd.DataFrame(
+        {"id_order": rng.randint(0, 600, 2000), "sku": skus[rng.randint(0, 50, 2000)]}
+    )
+
+
+def write_trans(data_items, filepath, min_products=2):
+    """ Writes the orders with at least ``min_products`` line items like
+        trans.csv, one basket per line in the order of ``id_order``.
+    """
+    lines = ["items"]
+    for _, skus in data_items.groupby("id_order").sku:
+        if len(skus) >= min_products:
+            lines.append(",".join(skus))
+    filepath.write_text("\n".join(lines) + "\n")
+
+
+def baskets(transactions):
+    return [sorted(transactions.basket(t)) for t in range(len(transactions))]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_baskets_from_lineitems_match_trans_csv(data_items, tmp_path, n_jobs):
+    write_trans(data_items, tmp_path / "trans.csv")
+    expected = read_transactions(tmp_path / "trans.csv")
+
+    # the row order of the line items does not matter
+    shuffled = data_items.sample(frac=1, random_state=1)
+    order_ids, transactions = baskets_from_lineitems(shuffled, n_jobs=n_jobs)
+
+    assert np.all(np.diff(order_ids) > 0)
+    assert baskets(transactions) == baskets(expected)
+
+
+def test_baskets_from_categorical_lineitems(data_items):
+    _, expected = baskets_from_lineitems(data_items)
+    categorical = data_items.assign(sku=data_items.sku.astype("category"))
+    _, transactions = baskets_from_lineitems(categorical)
+    assert baskets(transactions) == baskets(expected)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_baskets_from_no_lineitems(data_items, n_jobs):
+    order_ids, transactions = baskets_from_lineitems(data_items.iloc[:0], n_jobs=n_jobs)
+    assert len(order_ids) == 0
+    assert len(transactions) == 0
+    assert transactions.indptr.tolist() == [0]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+def test_blank_lines_are_skipped(tmp_path, chunksize):
+    filepath = tmp_path / "trans.csv"
+    filepath.write_text("items\na,b\n\n  \nc\nb,d\n\n\n")
+    transactions = read_transactions(filepath, chunksize=chunksize)
+    assert baskets(transactions) == [["a", "b"], ["c"], ["b", "d"]]
+
+    filepath.write_text("items\na,b\nc\n\n\n")
+    assert baskets(read_transactions(filepath, chunksize=2)) == [["a", "b"], ["c"]]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.transactions import transactions_from_baskets
+from src.models.itemsets import frequent_itemsets
+from src.models.windows import windowed_itemsets
+
+
+@pytest.fixture
+def history(random_baskets):
+    rng = np.random.RandomState(0)
+    days = pd.date_range("2017-01-01", "2018-02-28", freq="D")
+    baskets = []
+    dates = []
+    for day, date in enumerate(days):
+        # the popular skus drift over the 14 months
+        weights = 1.0 / (1 + (np.arange(25) + day // 20) % 25) ** 1.5
+        day_baskets = random_baskets(rng.poisson(4), 25, 7, weights, rng)
+        baskets.extend(day_baskets)
+        dates.extend([date] * len(day_baskets))
+    # shuffled so that the windows cannot rely on the input being sorted
+    order = rng.permutation(len(baskets))
+    return (
+        transactions_from_baskets(baskets[i] for i in order),
+        pd.Series(dates).iloc[order].reset_index(drop=True),
+    )
+
+
+def by_label(itemsets):
+    labels = itemsets.labels
+    return {
+        tuple(sorted(labels[i] for i in itemset)): count
+        for itemset, count in itemsets.counts.items()
+    }
+
+
+@pytest.mark.parametrize("max_len", [None, 2])
+def test_windows_match_mining_each_window(history, max_len):
+    transactions, dates = history
+    windows = windowed_itemsets(
+        transactions, dates, window=30, step=7, min_support=0.05, max_len=max_len
+    )
+    days = dates.to_numpy().astype("datetime64[D]")
+    assert len(windows) > 50
+
+    for w, end in enumerate(windows.ends):
+        rows = np.flatnonzero((days > end - np.timedelta64(30, "D")) & (days <= end))
+        assert windows.n_transactions[w] == len(rows)
+        expected = frequent_itemsets(
+            transactions.take(rows), 0.05, max_len, method="fpgrowth"
+        )
+        assert by_label(windows.frequent(w)) == by_label(expected)